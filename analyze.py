@@ -0,0 +1,366 @@
+"""
+Batch analysis of positions.
+
+Positions are read one at a time from a file or from standard input, either
+as game records (one per line, see game_record), each standing for the
+position at the end of the record, or as Stonehenge states in the binary
+encoding of StonehengeState.to_bytes, one after another. Each position is
+evaluated in a pool of worker processes, and one line is written per
+position, in input order:
+
+    NUMBER MOVE SCORE DEPTH
+
+where NUMBER counts positions from 0, MOVE is the best move found ('-' if
+the game is over), SCORE is the score for the player to move, and DEPTH is
+'exact' if the score is exact, or else the number of moves searched before
+falling back on rough_outcome.
+
+With --strategy KEY, the move is chosen by the strategy with that key in
+game_interface.usable_strategies instead, given a SearchBudget of --seconds
+if it takes one. SCORE is then the outcome or rough_outcome of the position
+after MOVE, for the player to move, and DEPTH is KEY unless the move ends
+the game.
+
+Positions are read and evaluated in batches, so memory use does not grow
+with the number of positions.
+
+Usage: python analyze.py [--binary] [--depth N | --strategy KEY]
+                         [--seconds S] [PATH]
+"""
+import itertools
+import multiprocessing
+import sys
+import time
+from typing import Any, BinaryIO, Iterator, List, Optional, TextIO, Tuple
+from game_state import GameState
+from solver import Solver
+
+# The solver each worker process uses for all the positions it solves
+# exactly, so that positions shared between them are only solved once. At
+# about 170 bytes a score, its table stays under 50MB per worker.
+_WORKER_SOLVER = Solver(max_entries=1 << 18)
+
+
+class _OutOfTime(Exception):
+    """
+    Raised when a search runs past its deadline.
+    """
+
+
+def read_positions(stream: TextIO) -> Iterator[GameState]:
+    """
+    Yield the final position of every game record in stream.
+
+    >>> import io
+    >>> [state.current_total for state in
+    ...  read_positions(io.StringIO('s 10 1 4\\n\\ns 9 2\\n'))]
+    [6, 9]
+    """
+    from game_record import GameRecord, replay
+    for line in stream:
+        if line.strip():
+            yield replay(GameRecord.from_line(line))
+
+
+def read_binary(stream: BinaryIO) -> Iterator[GameState]:
+    """
+    Yield every Stonehenge state encoded in stream by to_bytes.
+
+    Raise a ValueError naming the state, counting from 0, if a state has a
+    board size that does not exist or stream ends partway through it.
+
+    >>> import io
+    >>> from stonehenge import StonehengeGame, encode_states
+    >>> state = StonehengeGame(True, 2).current_state
+    >>> data = encode_states([state, state.make_move('C')])
+    >>> [state.cells[2] for state in read_binary(io.BytesIO(data))]
+    ['C', 1]
+    >>> list(read_binary(io.BytesIO(data[:5] + b'\\x07')))
+    Traceback (most recent call last):
+    ...
+    ValueError: state 1 has board size 7, which does not exist
+    """
+    from stonehenge import MAX_SIZE, StonehengeState, get_geometry
+    for number in itertools.count():
+        header = stream.read(1)
+        if not header:
+            return
+        size = header[0] & 7
+        if not 1 <= size <= MAX_SIZE:
+            raise ValueError('state {} has board size {}, which does not '
+                             'exist'.format(number, size))
+        length = get_geometry(size).encoded_length
+        body = stream.read(length - 1)
+        if len(body) != length - 1:
+            raise ValueError('the input ends partway through state '
+                             '{}'.format(number))
+        yield StonehengeState.from_bytes(header + body)
+
+
+def _negamax(state: GameState, depth: int,
+             deadline: Optional[float]) -> Tuple[float, bool]:
+    """
+    Return the score of state for its current player, searching depth moves
+    ahead and using rough_outcome beyond that, and whether the score is
+    exact.
+
+    Raise _OutOfTime if the search is still running at time deadline.
+    """
+    outcome = state.outcome()
+    if outcome is not None:
+        return outcome, True
+    if depth == 0:
+        return state.rough_outcome(), False
+    if deadline is not None and time.monotonic() > deadline:
+        raise _OutOfTime
+    best = GameState.LOSE - 1
+    exact = True
+    for move in state.iter_moves():
+        score, child_exact = _negamax(state.make_move(move), depth - 1,
+                                      deadline)
+        exact = exact and child_exact
+        best = max(best, -score)
+        if -score == GameState.WIN and child_exact:
+            return best, True
+    return best, exact
+
+
+def _search(state: GameState, depth: int,
+            deadline: Optional[float]) -> Tuple[Any, float, bool]:
+    """
+    Return the best move from state searching depth moves ahead, its score
+    and whether the score is exact.
+    """
+    best_move = None
+    best_score = GameState.LOSE - 1
+    exact = True
+    for move in state.get_search_moves():
+        score, child_exact = _negamax(state.make_move(move), depth - 1,
+                                      deadline)
+        exact = exact and child_exact
+        if -score > best_score:
+            best_move, best_score = move, -score
+            if best_score == GameState.WIN and child_exact:
+                return best_move, best_score, True
+    return best_move, best_score, exact
+
+
+def _game_for(state: GameState) -> Any:
+    """
+    Return a game whose current state is state.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> _game_for(SubtractSquareState(False, 7)).current_state.current_total
+    7
+    """
+    from stonehenge import StonehengeGame, StonehengeState
+    from subtract_square_game import SubtractSquareGame
+    if isinstance(state, StonehengeState):
+        game = StonehengeGame(state.p1_turn, state.size)
+    else:
+        game = SubtractSquareGame(state.p1_turn, state.current_total)
+    game.current_state = state
+    return game
+
+
+def _strategy_move(state: GameState, strategy_key: str,
+                   seconds: Optional[float]) -> Tuple[Any, float, str]:
+    """
+    Return the move the strategy with strategy_key picks from state, within
+    seconds if it takes a budget, the score of the position it leads to for
+    the player to move, and strategy_key, or 'exact' if the move ends the
+    game.
+    """
+    import inspect
+    from game_interface import usable_strategies
+    strategy = usable_strategies[strategy_key]
+    if seconds is not None and \
+            'budget' in inspect.signature(strategy).parameters:
+        from search_budget import SearchBudget
+        move = strategy(_game_for(state),
+                        budget=SearchBudget(max_seconds=seconds))
+    else:
+        move = strategy(_game_for(state))
+    child = state.make_move(move)
+    outcome = child.outcome()
+    if outcome is not None:
+        return move, -outcome, 'exact'
+    return move, -child.rough_outcome(), strategy_key
+
+
+def evaluate(state: GameState, depth: Optional[int] = None,
+             seconds: Optional[float] = None,
+             strategy_key: Optional[str] = None) -> Tuple[Any, float, str]:
+    """
+    Return the best move from state, its score for the player to move and
+    the depth searched, which is 'exact' if the score is exact.
+
+    With neither depth nor seconds, state is solved exactly. Otherwise the
+    search deepens one move at a time up to depth moves, stopping early once
+    seconds have passed or the score is exact; the result of the deepest
+    completed search is returned.
+
+    If strategy_key is given, the move is chosen by the strategy with that
+    key in usable_strategies instead (see _strategy_move).
+
+    Raise a ValueError if depth is less than 1, if both depth and
+    strategy_key are given, or if strategy_key is not a usable strategy.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> evaluate(SubtractSquareState(True, 18))
+    (1, 1, 'exact')
+    >>> evaluate(SubtractSquareState(True, 18), depth=1)
+    (16, 1, '1')
+    >>> evaluate(SubtractSquareState(True, 0))
+    (None, -1, 'exact')
+    >>> evaluate(SubtractSquareState(True, 18), strategy_key='mr')
+    (1, 0, 'mr')
+    >>> evaluate(SubtractSquareState(True, 4), strategy_key='ro')
+    (4, 1, 'exact')
+    """
+    if depth is not None and depth < 1:
+        raise ValueError('the search depth must be at least 1')
+    if strategy_key is not None:
+        from game_interface import usable_strategies
+        if depth is not None:
+            raise ValueError('a strategy cannot be given a search depth')
+        if strategy_key not in usable_strategies:
+            raise ValueError('unknown strategy {}'.format(strategy_key))
+    outcome = state.outcome()
+    if outcome is not None:
+        return None, outcome, 'exact'
+    if strategy_key is not None:
+        return _strategy_move(state, strategy_key, seconds)
+    if depth is None and seconds is None:
+        return _WORKER_SOLVER.best_move(state), \
+            _WORKER_SOLVER.score(state), 'exact'
+
+    deadline = None if seconds is None else time.monotonic() + seconds
+    result = None
+    for current in itertools.count(1):
+        if depth is not None and current > depth:
+            break
+        try:
+            move, score, exact = _search(state, current,
+                                         None if result is None else deadline)
+        except _OutOfTime:
+            break
+        result = (move, score, 'exact' if exact else str(current))
+        if exact:
+            break
+    return result
+
+
+def _evaluate_job(job: Tuple[GameState, Optional[int], Optional[float],
+                             Optional[str]]) -> Tuple[Any, float, str]:
+    """
+    Return evaluate applied to the state, budgets and strategy in job.
+    """
+    return evaluate(*job)
+
+
+def _search_depth(text: str) -> int:
+    """
+    Return the search depth given on the command line as text.
+
+    Raise an argparse.ArgumentTypeError if it is not a whole number of at
+    least 1.
+
+    >>> _search_depth('3')
+    3
+    """
+    import argparse
+    try:
+        depth = int(text)
+    except ValueError:
+        depth = 0
+    if depth < 1:
+        raise argparse.ArgumentTypeError(
+            '{} is not a search depth of at least 1'.format(text))
+    return depth
+
+
+def format_result(number: int, result: Tuple[Any, float, str]) -> str:
+    """
+    Return the output line for the result of evaluating the number-th
+    position.
+
+    >>> format_result(3, ('B', 1, 'exact'))
+    '3 B 1 exact'
+    >>> format_result(4, (None, -0.25, '2'))
+    '4 - -0.25 2'
+    """
+    move, score, depth = result
+    if isinstance(score, float) and score.is_integer():
+        score = int(score)
+    return '{} {} {} {}'.format(number, '-' if move is None else move,
+                                score, depth)
+
+
+def analyze(positions: Iterator[GameState], output: TextIO,
+            depth: Optional[int] = None, seconds: Optional[float] = None,
+            processes: Optional[int] = None, batch_size: int = 1024,
+            strategy_key: Optional[str] = None) -> None:
+    """
+    Evaluate every position in positions in a pool of processes worker
+    processes, with the strategy with strategy_key if it is given, writing a
+    line for each to output in order. Only batch_size positions are held in
+    memory at a time.
+
+    >>> import io
+    >>> records = io.StringIO('s 18 1\\ns 18 1 1\\n')
+    >>> output = io.StringIO()
+    >>> analyze(read_positions(records), output, processes=1)
+    >>> print(output.getvalue(), end='')
+    0 1 1 exact
+    1 1 -1 exact
+    """
+    number = 0
+    with multiprocessing.Pool(processes) as pool:
+        while True:
+            batch: List[Tuple[GameState, Optional[int], Optional[float],
+                              Optional[str]]] = \
+                [(state, depth, seconds, strategy_key) for state in
+                 itertools.islice(positions, batch_size)]
+            if not batch:
+                return
+            for result in pool.imap(_evaluate_job, batch):
+                output.write(format_result(number, result) + '\n')
+                number += 1
+            output.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Evaluate positions.')
+    parser.add_argument('path', nargs='?',
+                        help='the file of positions, or - for standard '
+                             'input (the default)')
+    parser.add_argument('--binary', action='store_true',
+                        help='read Stonehenge states encoded by to_bytes '
+                             'instead of game records')
+    from game_interface import usable_strategies
+    choice = parser.add_mutually_exclusive_group()
+    choice.add_argument('--depth', type=_search_depth,
+                        help='the most moves to search ahead')
+    choice.add_argument('--strategy',
+                        choices=[key for key in usable_strategies
+                                 if key != 'i'],
+                        help='the strategy that chooses the moves, instead '
+                             'of the solver')
+    parser.add_argument('--seconds', type=float,
+                        help='the time to spend on each position')
+    parser.add_argument('--processes', type=int,
+                        help='the number of worker processes')
+    args = parser.parse_args()
+
+    if args.binary:
+        source = sys.stdin.buffer if args.path in (None, '-') else \
+            open(args.path, 'rb')
+        states = read_binary(source)
+    else:
+        source = sys.stdin if args.path in (None, '-') else open(args.path)
+        states = read_positions(source)
+    with source:
+        analyze(states, sys.stdout, args.depth, args.seconds, args.processes,
+                strategy_key=args.strategy)
@@ -0,0 +1,61 @@
+"""
+Unittests for the batch analysis tool.
+"""
+import io
+import unittest
+
+from analyze import analyze, evaluate, read_binary, read_positions
+from solver import Solver
+from stonehenge import StonehengeGame, encode_states
+from strategy import minimax_strategy_r
+
+
+class AnalyzeUnitTests(unittest.TestCase):
+    def test_exact_analysis_agrees_with_solver(self):
+        """
+        Test that exact analysis reports the solver's move and score for
+        every position, in input order.
+        """
+        lines = ['h 2 1 A', 'h 2 2 BF', 's 20 1', 'h 1 1 B']
+        output = io.StringIO()
+        analyze(read_positions(io.StringIO('\n'.join(lines))), output,
+                processes=2, batch_size=3)
+        results = output.getvalue().splitlines()
+        self.assertEqual(len(results), len(lines))
+        for number, state in enumerate(
+                read_positions(io.StringIO('\n'.join(lines)))):
+            move = Solver().best_move(state)
+            self.assertEqual(results[number].split(), [
+                str(number), '-' if move is None else str(move),
+                str(Solver().score(state)), 'exact'])
+
+    def test_strategy_analysis(self):
+        """
+        Test that analysis with a strategy reports the strategy's move.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['A', 'F']:
+            game.current_state = game.current_state.make_move(move)
+        move, _, depth = evaluate(game.current_state, strategy_key='mr')
+        self.assertEqual(move, minimax_strategy_r(game))
+        self.assertIn(depth, ('mr', 'exact'))
+
+        with self.assertRaises(ValueError):
+            evaluate(game.current_state, depth=2, strategy_key='mr')
+        with self.assertRaises(ValueError):
+            evaluate(game.current_state, strategy_key='xx')
+
+    def test_read_binary_rejects_corrupt_input(self):
+        """
+        Test that a bad board size or a truncated state in binary input
+        raises a ValueError naming the state.
+        """
+        state = StonehengeGame(True, 2).current_state
+        data = encode_states([state, state.make_move('C')])
+        for corrupt in [data + b'\x06', data[:-1]]:
+            with self.assertRaisesRegex(ValueError, 'state [12]'):
+                list(read_binary(io.BytesIO(corrupt)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,394 @@
+"""
+Vectorized move evaluation for Stonehenge using NumPy.
+
+A board is described by an incidence matrix with one row per cell and one
+column per ley-line. A position is stored as an array of cell owners and an
+array of ley-line claims, where 0 means free or unclaimed and 1 or 2 is the
+player. Evaluating every legal move of a position is then a handful of array
+operations instead of one make_move call per move, and many independent
+positions on the same board can be stacked into 2D arrays and evaluated in
+one call.
+
+This module needs NumPy, which is listed in requirements.txt.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from game_state import GameState
+from stonehenge import StonehengeState, get_geometry
+
+
+class BoardTables:
+    """
+    The arrays describing a Stonehenge board of a certain size.
+
+    incidence - a (cells x ley-lines) matrix, with 1 where the cell lies on
+    the ley-line
+    thresholds - the number of cells needed to claim each ley-line
+    win_threshold - the number of ley-lines needed to win
+    """
+    incidence: np.ndarray
+    thresholds: np.ndarray
+    win_threshold: float
+
+    def __init__(self, size: int) -> None:
+        """
+        Build the arrays for a board with side length size.
+
+        >>> tables = BoardTables(1)
+        >>> tables.incidence.tolist()
+        [[1, 0, 0, 1, 0, 1], [0, 1, 1, 0, 0, 1], [0, 1, 0, 1, 1, 0]]
+        >>> tables.win_threshold
+        3.0
+        """
+        geometry = get_geometry(size)
+        self.incidence = np.zeros((len(geometry.cell_names),
+                                   len(geometry.ley_lines)), dtype=np.int16)
+        for line, cells in enumerate(geometry.ley_lines):
+            self.incidence[list(cells), line] = 1
+        self.thresholds = np.array(geometry.thresholds)
+        self.win_threshold = geometry.win_threshold
+
+
+# The score of a cell that cannot be taken.
+ILLEGAL = -2
+
+_TABLES: Dict[int, BoardTables] = {}
+
+
+def get_tables(size: int) -> BoardTables:
+    """
+    Return the shared arrays for a board with side length size.
+
+    >>> get_tables(2) is get_tables(2)
+    True
+    """
+    if size not in _TABLES:
+        _TABLES[size] = BoardTables(size)
+    return _TABLES[size]
+
+
+def state_to_arrays(state: StonehengeState) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the cell owners and ley-line claims of state as arrays.
+
+    >>> cells = [1, 'B', 'C']
+    >>> owners, claims = state_to_arrays(StonehengeState(False, cells,
+    ...                                  [1, '@', '@', 1, '@', 1]))
+    >>> owners.tolist()
+    [1, 0, 0]
+    >>> claims.tolist()
+    [1, 0, 0, 1, 0, 1]
+    """
+    owners = np.array([cell if type(cell) is int else 0 for cell in
+                       state.cells], dtype=np.int8)
+    claims = np.array([score if type(score) is int else 0 for score in
+                       state.ley_line_scores], dtype=np.int8)
+    return owners, claims
+
+
+def expand(tables: BoardTables, owners: np.ndarray, claims: np.ndarray,
+           player: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the free cells of the position (owners, claims), the ley-line
+    claims after player takes each of them, and whether each of those moves
+    wins the game for player.
+
+    >>> tables = get_tables(1)
+    >>> owners = np.zeros(3, dtype=np.int8)
+    >>> claims = np.zeros(6, dtype=np.int8)
+    >>> free, child_claims, wins = expand(tables, owners, claims, 1)
+    >>> free.tolist()
+    [0, 1, 2]
+    >>> child_claims[0].tolist()
+    [1, 0, 0, 1, 0, 1]
+    >>> wins.tolist()
+    [True, True, True]
+    """
+    free = np.flatnonzero(owners == 0)
+    counts = (owners == player).astype(np.int16) @ tables.incidence
+    child_counts = counts + tables.incidence[free]
+    claimed = (child_counts >= tables.thresholds) & (claims == 0)
+    child_claims = np.where(claimed, np.int8(player), claims)
+    wins = (child_claims == player).sum(axis=-1) >= tables.win_threshold
+    return free, child_claims, wins
+
+
+class MoveEvaluation:
+    """
+    The result of evaluating every legal move of a Stonehenge state at once.
+
+    moves - the legal moves, in the same order as get_possible_moves
+    claims - a (moves x ley-lines) array of the ley-line claims after each
+    move, where 0 means unclaimed
+    wins - whether each move wins the game immediately
+    """
+    moves: List[str]
+    claims: np.ndarray
+    wins: np.ndarray
+
+    def __init__(self, moves: List[str], claims: np.ndarray,
+                 wins: np.ndarray) -> None:
+        """
+        Initialize this MoveEvaluation.
+        """
+        self.moves = moves
+        self.claims = claims
+        self.wins = wins
+
+
+def evaluate_moves(state: StonehengeState) -> MoveEvaluation:
+    """
+    Return the ley-line claims and win flags for every legal move of state.
+
+    >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
+    >>> state = StonehengeState(True, cells, ['@'] * 9)
+    >>> evaluation = evaluate_moves(state)
+    >>> evaluation.moves
+    ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+    >>> evaluation.claims[0].tolist()
+    [1, 0, 0, 0, 0, 0, 0, 0, 1]
+    >>> evaluation.wins.tolist()
+    [False, False, False, False, False, False, False]
+    """
+    if not state.get_possible_moves():
+        return MoveEvaluation([], np.zeros((0, len(state.ley_line_scores)),
+                                           dtype=np.int8),
+                              np.zeros(0, dtype=bool))
+    tables = get_tables(state.size)
+    owners, claims = state_to_arrays(state)
+    free, child_claims, wins = expand(tables, owners, claims,
+                                      1 if state.p1_turn else 2)
+    names = state.geometry.cell_names
+    return MoveEvaluation([names[i] for i in free], child_claims, wins)
+
+
+def rough_scores(tables: BoardTables, owners: np.ndarray, claims: np.ndarray,
+                 player: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the free cells of the position (owners, claims) with player to
+    move, and for each of them the score rough_outcome_strategy gives it:
+    the negated rough_outcome of the opponent after that move.
+
+    >>> tables = get_tables(2)
+    >>> owners = np.array([1, 0, 0, 1, 0, 2, 0], dtype=np.int8)
+    >>> claims = np.array([0, 0, 0, 0, 1, 0, 0, 0, 1], dtype=np.int8)
+    >>> free, scores = rough_scores(tables, owners, claims, 2)
+    >>> free.tolist()
+    [1, 2, 4, 6]
+    >>> scores.tolist()
+    [-1, -1, 1, -1]
+    """
+    free = np.flatnonzero(owners == 0)
+    scores = batch_rough_scores(tables, owners[None], claims[None],
+                                np.array([player], dtype=np.int8))
+    return free, scores[0, free]
+
+
+def _two_plies(tables: BoardTables, owners: np.ndarray, claims: np.ndarray,
+               players: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Return, for the positions (owners, claims) with players to move, which
+    cells are free, the claims after each move and whether it wins, and for
+    each pair of a move and an opponent's reply whether the pair is legal,
+    the claims after the reply and whether the reply wins.
+
+    The returned arrays are indexed by (position, move) and (position, move,
+    reply) respectively.
+    """
+    players = players.astype(np.int8)
+    others = 3 - players
+    player_ = players[:, None, None]
+    other_ = others[:, None, None]
+    incidence = tables.incidence
+    free = owners == 0
+    distinct = ~np.eye(incidence.shape[0], dtype=bool)
+    counts_player = (owners == players[:, None]).astype(np.int16) @ incidence
+    counts_other = (owners == others[:, None]).astype(np.int16) @ incidence
+
+    # Our moves.
+    claims1 = np.where((counts_player[:, None, :] + incidence >=
+                        tables.thresholds) & (claims[:, None, :] == 0),
+                       player_, claims[:, None, :])
+    wins1 = ((claims1 == player_).sum(axis=-1) >= tables.win_threshold) & free
+
+    # The opponent's replies: the opponent's cell counts do not depend on our
+    # move, so only the claims differ between our moves.
+    legal2 = free[:, :, None] & free[:, None, :] & distinct
+    reply_counts = counts_other[:, None, :] + incidence
+    claims2 = np.where((reply_counts[:, None, :, :] >= tables.thresholds) &
+                       (claims1[:, :, None, :] == 0),
+                       other_[..., None], claims1[:, :, None, :])
+    wins2 = ((claims2 == other_[..., None]).sum(axis=-1) >=
+             tables.win_threshold) & legal2
+    return free, claims1, wins1, legal2, claims2, wins2
+
+
+def batch_rough_scores(tables: BoardTables, owners: np.ndarray,
+                       claims: np.ndarray, players: np.ndarray) -> np.ndarray:
+    """
+    Return a (positions x cells) array with the score rough_outcome_strategy
+    gives to taking each cell in each of the positions (owners, claims), with
+    players to move. Cells that are already taken score ILLEGAL.
+
+    The three plies rough_outcome_strategy looks at are evaluated as a
+    (positions x moves x replies x answers) array, where invalid combinations
+    (a cell that is taken, or the same cell taken twice) are masked out.
+
+    >>> tables = get_tables(2)
+    >>> owners = np.array([[0] * 7, [1, 0, 0, 0, 0, 0, 0]], dtype=np.int8)
+    >>> claims = np.array([[0] * 9, [1, 0, 0, 0, 0, 0, 0, 0, 1]],
+    ...                   dtype=np.int8)
+    >>> batch_rough_scores(tables, owners, claims,
+    ...                    np.array([1, 2], dtype=np.int8)).tolist()
+    [[0, 0, 0, 0, 0, 0, 0], [-2, -1, -1, -1, 0, 0, 0]]
+    """
+    player_ = players.astype(np.int8)[:, None, None]
+    free, claims1, wins1, legal2, claims2, wins2 = _two_plies(
+        tables, owners, claims, players)
+    incidence = tables.incidence
+    distinct = ~np.eye(incidence.shape[0], dtype=bool)
+    counts_player = (owners == players[:, None]).astype(np.int16) @ incidence
+
+    # Our answers to each reply.
+    legal3 = legal2[:, :, :, None] & legal2[:, :, None, :] & \
+        distinct[None, None, :, :]
+    answer_counts = counts_player[:, None, None, :] + \
+        incidence[None, :, None, :] + incidence[None, None, :, :]
+    claims3 = np.where((answer_counts[:, :, None, :, :] >=
+                        tables.thresholds) &
+                       (claims2[:, :, :, None, :] == 0),
+                       player_[..., None, None], claims2[:, :, :, None, :])
+    wins3 = ((claims3 == player_[..., None, None]).sum(axis=-1) >=
+             tables.win_threshold) & legal3
+
+    # A reply that the opponent cannot make counts as one we can punish.
+    punished = wins3.any(axis=-1) | ~legal2
+    scores = np.zeros(owners.shape, dtype=np.int8)
+    scores[punished.all(axis=-1)] = 1
+    scores[wins2.any(axis=-1)] = -1
+    scores[wins1] = 1
+    scores[~free] = ILLEGAL
+    return scores
+
+
+def states_to_batch(states: List[StonehengeState]) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the cell owners and ley-line claims of states as 2D arrays with
+    one row per state, and the player to move in each state.
+
+    Raise a ValueError if states are not all on boards of the same size.
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 1).current_state
+    >>> owners, claims, players = states_to_batch([state,
+    ...                                           state.make_move('B')])
+    >>> owners.tolist()
+    [[0, 0, 0], [0, 1, 0]]
+    >>> players.tolist()
+    [1, 2]
+    """
+    if len({state.size for state in states}) > 1:
+        raise ValueError('states must all be on boards of the same size')
+    owners = np.array([[cell if type(cell) is int else 0 for cell in
+                        state.cells] for state in states], dtype=np.int8)
+    claims = np.array([[score if type(score) is int else 0 for score in
+                        state.ley_line_scores] for state in states],
+                      dtype=np.int8)
+    players = np.array([1 if state.p1_turn else 2 for state in states],
+                       dtype=np.int8)
+    return owners, claims, players
+
+
+def batch_rough_outcome(states: List[StonehengeState]) -> np.ndarray:
+    """
+    Return the rough_outcome of each of states, computed for all of them at
+    once.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> states = [game.current_state]
+    >>> for move in ['D', 'A', 'C', 'E', 'G']:
+    ...     states.append(states[-1].make_move(move))
+    >>> batch_rough_outcome(states).tolist()
+    [0, 0, 0, 1, 0, -1]
+    """
+    if not states:
+        return np.zeros(0, dtype=np.int8)
+    tables = get_tables(states[0].size)
+    owners, claims, players = states_to_batch(states)
+    _, _, wins1, _, _, wins2 = _two_plies(tables, owners, claims, players)
+
+    lines_player = (claims == players[:, None]).sum(axis=1)
+    lines_other = (claims == (3 - players)[:, None]).sum(axis=1)
+    # Every move lets the opponent win at once; a taken cell counts too.
+    doomed = (wins2.any(axis=-1) | (owners != 0)).all(axis=1)
+
+    outcomes = np.full(len(states), GameState.DRAW, dtype=np.int8)
+    outcomes[doomed] = GameState.LOSE
+    outcomes[wins1.any(axis=1)] = GameState.WIN
+    outcomes[lines_other >= tables.win_threshold] = GameState.LOSE
+    outcomes[lines_player >= tables.win_threshold] = GameState.WIN
+    return outcomes
+
+
+def choose_moves(states: List[StonehengeState],
+                 chunk_size: int = 64) -> List[Optional[str]]:
+    """
+    Return the move rough_outcome_strategy would pick in each of states, or
+    None for states that are over.
+
+    The states are evaluated chunk_size at a time, which bounds the size of
+    the intermediate arrays.
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 1).current_state
+    >>> choose_moves([state, state.make_move('A')], chunk_size=1)
+    ['A', None]
+    """
+    moves = []
+    if not states:
+        return moves
+    tables = get_tables(states[0].size)
+    names = states[0].geometry.cell_names
+    owners, claims, players = states_to_batch(states)
+    lines_player = (claims == players[:, None]).sum(axis=1)
+    lines_other = (claims == (3 - players)[:, None]).sum(axis=1)
+    over = np.maximum(lines_player, lines_other) >= tables.win_threshold
+
+    for start in range(0, len(states), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        scores = batch_rough_scores(tables, owners[chunk], claims[chunk],
+                                    players[chunk])
+        for is_over, row in zip(over[chunk], scores):
+            if is_over or row.max() == ILLEGAL:
+                moves.append(None)
+            else:
+                moves.append(names[int(np.argmax(row))])
+    return moves
+
+
+def batch_rough_outcome_strategy(game: Any) -> Any:
+    """
+    Return the same move as rough_outcome_strategy for a game of Stonehenge,
+    evaluating all candidate moves with array operations.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> for move in ['A', 'F', 'D']:
+    ...     game.current_state = game.current_state.make_move(move)
+    >>> batch_rough_outcome_strategy(game)
+    'E'
+    """
+    state = game.current_state
+    if not state.get_possible_moves():
+        return None
+    owners, claims = state_to_arrays(state)
+    free, scores = rough_scores(get_tables(state.size), owners, claims,
+                                1 if state.p1_turn else 2)
+    return state.geometry.cell_names[free[int(np.argmax(scores))]]
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
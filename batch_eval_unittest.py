@@ -0,0 +1,83 @@
+"""
+Unittests checking the vectorized Stonehenge evaluation against the
+move-by-move implementation.
+"""
+import importlib.util
+import random
+import unittest
+
+from stonehenge import StonehengeGame
+from strategy import rough_outcome_strategy
+
+HAVE_NUMPY = importlib.util.find_spec('numpy') is not None
+if HAVE_NUMPY:
+    from batch_eval import batch_rough_outcome, \
+        batch_rough_outcome_strategy, choose_moves, evaluate_moves
+
+
+def random_games(seed, count):
+    """
+    Return count games of Stonehenge played randomly part of the way through.
+    """
+    rng = random.Random(seed)
+    games = []
+    while len(games) < count:
+        game = StonehengeGame(rng.random() < 0.5, rng.randint(1, 4))
+        for _ in range(rng.randint(0, len(game.current_state.cells) - 1)):
+            moves = game.current_state.get_possible_moves()
+            if not moves:
+                break
+            game.current_state = game.current_state.make_move(
+                rng.choice(moves))
+        if game.current_state.get_possible_moves():
+            games.append(game)
+    return games
+
+
+@unittest.skipUnless(HAVE_NUMPY, 'batch_eval needs NumPy')
+class BatchEvalUnitTests(unittest.TestCase):
+    def test_evaluate_moves_matches_make_move(self):
+        """
+        Test that the claims and win flags for every move match the states
+        make_move produces.
+        """
+        for game in random_games(0, 100):
+            state = game.current_state
+            evaluation = evaluate_moves(state)
+            self.assertEqual(evaluation.moves, state.get_possible_moves())
+            for move, claims, win in zip(evaluation.moves, evaluation.claims,
+                                         evaluation.wins):
+                new_state = state.make_move(move)
+                expected = [score if type(score) is int else 0
+                            for score in new_state.ley_line_scores]
+                self.assertEqual(claims.tolist(), expected)
+                self.assertEqual(bool(win), game.is_over(new_state))
+
+    def test_batch_rough_outcome_matches_rough_outcome(self):
+        """
+        Test that the vectorized strategy picks the same move as
+        rough_outcome_strategy.
+        """
+        for game in random_games(1, 200):
+            self.assertEqual(batch_rough_outcome_strategy(game),
+                             rough_outcome_strategy(game),
+                             str(game.current_state))
+
+    def test_batch_matches_single_positions(self):
+        """
+        Test that evaluating a batch of positions gives the same outcomes and
+        moves as evaluating each position on its own.
+        """
+        games = random_games(2, 120)
+        for size in range(1, 5):
+            states = [game.current_state for game in games
+                      if game.current_state.size == size]
+            self.assertEqual(batch_rough_outcome(states).tolist(),
+                             [state.rough_outcome() for state in states])
+            self.assertEqual(choose_moves(states, chunk_size=7),
+                             [rough_outcome_strategy(game) for game in games
+                              if game.current_state.size == size])
+
+
+if __name__ == "__main__":
+    unittest.main()
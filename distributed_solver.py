@@ -0,0 +1,274 @@
+"""
+A coordinator for solving a game across many worker processes.
+
+The coordinator expands the game tree from a root state down to a split
+depth and makes every distinct unfinished position it reaches there into a
+job. The jobs are solved independently by workers, each running a Solver,
+and the coordinator combines their scores back up the top of the tree with
+negamax.
+
+Jobs are submitted to a concurrent.futures executor: a process pool by
+default, or any executor that runs callables elsewhere, such as one that
+sends them to the machines of a cluster. A process pool the coordinator
+creates is its own and is shut down by close. As each job completes, its
+score is appended to a checkpoint file, so a solve that is interrupted
+resumes with only the unfinished jobs. Jobs are told apart by
+persistent_cache.state_key.
+
+Usage: python distributed_solver.py SIZE SPLIT_DEPTH CHECKPOINT
+"""
+import concurrent.futures
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from game_state import GameState
+from persistent_cache import state_key
+from solver import Solver
+
+CHECKPOINT_HEADER = 'solve-checkpoint'
+
+# The solver each worker process uses for all the jobs it runs, so that the
+# positions jobs share are only solved once per worker. Its memo table is
+# locked, so an executor running jobs in threads can share it too.
+_WORKER_SOLVER = Solver()
+
+
+def _solve_job(state: GameState) -> int:
+    """
+    Return the score of state for its current player with perfect play.
+    """
+    return _WORKER_SOLVER.score(state)
+
+
+def _drop_partial_line(path: str) -> None:
+    """
+    Truncate the file at path to its last complete line, so that lines
+    appended to it do not run on from a line cut short by a crash.
+    """
+    with open(path, 'rb+') as checkpoint:
+        data = checkpoint.read()
+        checkpoint.truncate(data.rfind(b'\n') + 1)
+
+
+def split(state: GameState, split_depth: int) -> List[GameState]:
+    """
+    Return the distinct unfinished positions split_depth moves below state,
+    in the order a depth-first search from state first reaches them.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> [job.current_total for job in split(SubtractSquareState(True, 9), 2)]
+    [7, 4, 1]
+    """
+    jobs = []
+    seen = set()
+
+    def visit(node: GameState, depth: int) -> None:
+        """
+        Add the jobs below node, which is depth moves above the split.
+        """
+        if node.outcome() is not None:
+            return
+        if depth == 0:
+            key = state_key(node)
+            if key not in seen:
+                seen.add(key)
+                jobs.append(node)
+            return
+        for move in node.get_search_moves():
+            visit(node.make_move(move), depth - 1)
+
+    visit(state, split_depth)
+    return jobs
+
+
+def _negamax(state: GameState, depth: int, scores: Dict[bytes, int]) -> int:
+    """
+    Return the score of state for its current player, where state is depth
+    moves above the split and scores holds the score of every job by its
+    state_key.
+    """
+    outcome = state.outcome()
+    if outcome is not None:
+        return outcome
+    if depth == 0:
+        return scores[state_key(state)]
+    best = GameState.LOSE
+    for move in state.iter_moves():
+        best = max(best, -_negamax(state.make_move(move), depth - 1, scores))
+        if best == GameState.WIN:
+            break
+    return best
+
+
+class DistributedSolver:
+    """
+    A coordinator that solves a game by splitting it into jobs.
+
+    split_depth - the number of moves between the root and the jobs
+    checkpoint_path - the file completed jobs are recorded in, or None
+    executor - the executor jobs run in
+    """
+    split_depth: int
+    checkpoint_path: Optional[str]
+    executor: concurrent.futures.Executor
+
+    def __init__(self, split_depth: int,
+                 checkpoint_path: Optional[str] = None,
+                 executor: Optional[concurrent.futures.Executor] = None) \
+            -> None:
+        """
+        Initialize this DistributedSolver. If no executor is given, jobs run
+        in a pool with a worker process per CPU, which close shuts down.
+
+        Raise a ValueError if split_depth is less than 1.
+
+        >>> with DistributedSolver(3) as solver:
+        ...     solver.split_depth
+        3
+        """
+        if split_depth < 1:
+            raise ValueError('the split depth must be at least 1')
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor()
+        self.split_depth = split_depth
+        self.checkpoint_path = checkpoint_path
+        self.executor = executor
+
+    def __enter__(self) -> 'DistributedSolver':
+        """
+        Return this DistributedSolver.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Close this DistributedSolver.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shut down the process pool this DistributedSolver created, waiting
+        for its workers to exit. An executor that was given is left running.
+        """
+        if self._owns_executor:
+            self.executor.shutdown()
+
+    def _header(self, root: GameState, job_count: int) -> str:
+        """
+        Return the first line of the checkpoint of a solve of root, which
+        identifies the solve.
+        """
+        digest = hashlib.blake2b(repr(root).encode(), digest_size=8)
+        return '{} {} {} {}'.format(CHECKPOINT_HEADER, self.split_depth,
+                                    job_count, digest.hexdigest())
+
+    def _load_checkpoint(self, header: str) -> Dict[int, int]:
+        """
+        Return the score of every job recorded in the checkpoint, by job
+        number.
+
+        Raise a ValueError if the checkpoint is for another solve.
+        """
+        done = {}
+        if self.checkpoint_path is None or \
+                not os.path.exists(self.checkpoint_path):
+            return done
+        with open(self.checkpoint_path) as checkpoint:
+            first = checkpoint.readline().rstrip('\n')
+            if first and first != header:
+                raise ValueError('{} is the checkpoint of another '
+                                 'solve'.format(self.checkpoint_path))
+            for line in checkpoint:
+                fields = line.split()
+                # A line cut short by a crash is ignored and solved again.
+                if len(fields) == 2 and line.endswith('\n'):
+                    done[int(fields[0])] = int(fields[1])
+        return done
+
+    def solve_jobs(self, root: GameState) -> Tuple[List[GameState],
+                                                   Dict[int, int]]:
+        """
+        Return the jobs of root and the score of every job, by job number,
+        solving the jobs that the checkpoint does not already record.
+        """
+        jobs = split(root, self.split_depth)
+        header = self._header(root, len(jobs))
+        done = self._load_checkpoint(header)
+        checkpoint = None
+        if self.checkpoint_path is not None:
+            if os.path.exists(self.checkpoint_path):
+                _drop_partial_line(self.checkpoint_path)
+            checkpoint = open(self.checkpoint_path, 'a')
+            if checkpoint.tell() == 0:
+                checkpoint.write(header + '\n')
+                checkpoint.flush()
+        try:
+            futures = {self.executor.submit(_solve_job, jobs[number]): number
+                       for number in range(len(jobs)) if number not in done}
+            for future in concurrent.futures.as_completed(futures):
+                number = futures[future]
+                done[number] = future.result()
+                if checkpoint is not None:
+                    checkpoint.write('{} {}\n'.format(number, done[number]))
+                    checkpoint.flush()
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        return jobs, done
+
+    def _job_scores(self, root: GameState) -> Dict[bytes, int]:
+        """
+        Return the score of every job of root, by the job's state_key.
+        """
+        jobs, done = self.solve_jobs(root)
+        return {state_key(jobs[number]): score
+                for number, score in done.items()}
+
+    def score(self, root: GameState) -> int:
+        """
+        Return the score of root for its current player with perfect play.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        ...     DistributedSolver(2, executor=executor).score(
+        ...         SubtractSquareState(True, 18))
+        1
+        """
+        return _negamax(root, self.split_depth, self._job_scores(root))
+
+    def best_move(self, root: GameState) -> Any:
+        """
+        Return the first of the best moves from root, or None if the game is
+        over at root.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        ...     DistributedSolver(3, executor=executor).best_move(
+        ...         SubtractSquareState(True, 18))
+        1
+        """
+        if root.outcome() is not None:
+            return None
+        scores = self._job_scores(root)
+        best_move = None
+        best_score = GameState.LOSE - 1
+        for move in root.get_search_moves():
+            score = -_negamax(root.make_move(move), self.split_depth - 1,
+                              scores)
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 4:
+        from stonehenge import StonehengeGame
+        state = StonehengeGame(True, int(sys.argv[1])).current_state
+        with DistributedSolver(int(sys.argv[2]), sys.argv[3]) as solver:
+            print(solver.score(state))
+    else:
+        from python_ta import check_all
+        check_all(config="a2_pyta.txt")
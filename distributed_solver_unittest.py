@@ -0,0 +1,85 @@
+"""
+Unittests for the distributed solver.
+"""
+import concurrent.futures
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from distributed_solver import DistributedSolver
+from solver import Solver
+from stonehenge import StonehengeGame
+
+
+class DistributedSolverUnitTests(unittest.TestCase):
+    def test_distributed_solver_resumes_from_checkpoint(self):
+        """
+        Test that the distributed solver agrees with the solver, and that a
+        solve resumed from a partial checkpoint only runs the missing jobs.
+        """
+        game = StonehengeGame(True, 2)
+        state = game.current_state
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            solver = DistributedSolver(2, path, executor)
+            self.assertEqual(solver.score(state), Solver().score(state))
+            with open(path) as checkpoint:
+                lines = checkpoint.readlines()
+            with open(path, 'w') as checkpoint:
+                checkpoint.writelines(lines[:len(lines) // 2])
+
+            submitted = []
+            submit = executor.submit
+
+            def counting_submit(*args):
+                submitted.append(args)
+                return submit(*args)
+            with patch.object(executor, 'submit', counting_submit):
+                self.assertEqual(solver.best_move(state),
+                                 Solver().best_move(state))
+        self.assertEqual(len(submitted), len(lines) - len(lines) // 2)
+
+    def test_resume_from_truncated_checkpoint(self):
+        """
+        Test that a line cut short by a crash is dropped before the resumed
+        solve appends to the checkpoint, so no job is recorded wrongly.
+        """
+        state = StonehengeGame(True, 2).current_state
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            solver = DistributedSolver(2, path, executor)
+            expected = solver.solve_jobs(state)[1]
+            with open(path) as checkpoint:
+                lines = checkpoint.readlines()
+            for kept in (1, 3):
+                with open(path, 'w') as checkpoint:
+                    checkpoint.writelines(lines[:kept])
+                    checkpoint.write(lines[kept][:1])
+                self.assertEqual(solver.solve_jobs(state)[1], expected)
+                with open(path) as checkpoint:
+                    resumed = checkpoint.readlines()[1:]
+                self.assertEqual(
+                    {int(line.split()[0]): int(line.split()[1])
+                     for line in resumed}, expected)
+                self.assertEqual(len(resumed), len(expected))
+            self.assertEqual(solver.score(state), Solver().score(state))
+
+    def test_close_shuts_down_own_pool(self):
+        """
+        Test that closing a distributed solver shuts down the process pool it
+        created, but not an executor it was given.
+        """
+        state = StonehengeGame(True, 1).current_state
+        with DistributedSolver(1) as solver:
+            self.assertEqual(solver.score(state), Solver().score(state))
+        with self.assertRaises(RuntimeError):
+            solver.executor.submit(int)
+
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            DistributedSolver(1, executor=executor).close()
+            self.assertEqual(executor.submit(int).result(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
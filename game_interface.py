@@ -9,23 +9,101 @@ strategy cannot be used on Chopsticks unless you account for infinite loops.
 your own curiousity!)
 """
 # TODO: import the modules needed to make game_interface run.
-from strategy import *
-from typing import Any, Callable
-from subtract_square_game import SubtractSquareGame
-from stonehenge import StonehengeGame
+import importlib
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional
+
+
+class LazyRegistry(Mapping):
+    """
+    A mapping from keys to objects defined in other modules, where a module is
+    only imported when one of its objects is first looked up. This keeps
+    importing game_interface, and starting processes that use it, cheap.
+
+    paths - the 'module:name' path of the object for each key
+    """
+    paths: Dict[str, str]
+
+    def __init__(self, paths: Dict[str, str]) -> None:
+        """
+        Initialize this LazyRegistry with nothing imported yet.
+
+        >>> registry = LazyRegistry({'s': 'subtract_square_game:'
+        ...                               'SubtractSquareGame'})
+        >>> registry.name('s')
+        'SubtractSquareGame'
+        >>> registry['s'].__name__
+        'SubtractSquareGame'
+        """
+        self.paths = dict(paths)
+        self._loaded = {}
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Return the object for key, importing its module if needed.
+        """
+        if key not in self._loaded:
+            module_name, name = self.paths[key].split(':')
+            self._loaded[key] = getattr(importlib.import_module(module_name),
+                                        name)
+        return self._loaded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Return an iterator over the keys of this LazyRegistry.
+        """
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        """
+        Return the number of keys in this LazyRegistry.
+        """
+        return len(self.paths)
+
+    def name(self, key: str) -> str:
+        """
+        Return the name of the object for key, without importing it.
+        """
+        return self.paths[key].split(':')[1]
+
 
 # TODO: Replace None with the corresponding class name for your games.
 # 'h' should map to Stonehenge.
-playable_games = {'s': SubtractSquareGame,
-                  'h': StonehengeGame}
+playable_games = LazyRegistry({'s': 'subtract_square_game:SubtractSquareGame',
+                               'h': 'stonehenge:StonehengeGame'})
 
 # TODO: Replace None with the corresponding function names for your strategies.
 # 'mr' should map to your recursive implementation of minimax while
 # 'mi' should map to your iterative implementation of minimax
-usable_strategies = {'i': interactive_strategy,
-                     'ro': rough_outcome_strategy,
-                     'mr': minimax_strategy_r,
-                     'mi': minimax_strategy_i}
+usable_strategies = LazyRegistry({'i': 'strategy:interactive_strategy',
+                                  'ro': 'strategy:rough_outcome_strategy',
+                                  'mr': 'strategy:minimax_strategy_r',
+                                  'mi': 'strategy:minimax_strategy_i',
+                                  'sv': 'solver:solver_strategy',
+                                  'ts': 'threat_space:threat_space_strategy'})
+
+
+def budgeted(strategy: Callable, budget: Any) -> Callable[[Any], Any]:
+    """
+    Return strategy made to stay within the SearchBudget budget, printing
+    what the search spent whenever it had to degrade. A strategy that takes
+    no budget is returned unchanged.
+
+    >>> budgeted(usable_strategies['i'], None) is usable_strategies['i']
+    True
+    """
+    import inspect
+    if 'budget' not in inspect.signature(strategy).parameters:
+        return strategy
+
+    def budgeted_strategy(game: Any) -> Any:
+        """
+        Return the move strategy picks for game within budget.
+        """
+        move = strategy(game, budget=budget)
+        if budget.degraded or budget.evictions:
+            print('The search went over budget ({}).'.format(budget))
+        return move
+    return budgeted_strategy
 
 
 class GameInterface:
@@ -35,11 +113,14 @@ class GameInterface:
     """
 
     def __init__(self, game: Any, p1_strategy: Callable,
-                 p2_strategy: Callable[[Any], Any]) -> None:
+                 p2_strategy: Callable[[Any], Any],
+                 p1_starts: Optional[bool] = None,
+                 param: Optional[int] = None) -> None:
         """
         Initialize this GameInterface, setting its active game to game, and
         using the strategies p1_strategy for Player 1 and p2_strategy for
-        Player 2.
+        Player 2. The user is only asked who moves first if p1_starts is
+        None, and for the board size or starting total if param is None.
 
         :param game: The game to be played.
         :type game:
@@ -48,20 +129,28 @@ class GameInterface:
         :param p2_strategy: The strategy for Play 2.
         :type p2_strategy:
         """
-        first_player = input("Type y if player 1 is to make the first move: ")
-        is_p1_turn = False
-        if first_player.lower() == 'y':
-            is_p1_turn = True
+        if p1_starts is None:
+            first_player = input(
+                "Type y if player 1 is to make the first move: ")
+            p1_starts = first_player.lower() == 'y'
 
-        self.game = game(is_p1_turn)
+        if param is None:
+            self.game = game(p1_starts)
+        else:
+            self.game = game(p1_starts, param)
         self.p1_strategy = p1_strategy
         self.p2_strategy = p2_strategy
 
-    def play(self) -> None:
+    def play(self, writer: Optional['RecordWriter'] = None) -> None:
         """
-        Play the game.
+        Play the game. If writer is given, write the record of the game to it
+        once the game is over.
         """
         current_state = self.game.current_state
+        record = None
+        if writer is not None:
+            from game_record import record_for
+            record = record_for(self.game)
 
         print(self.game.get_instructions())
         print(current_state)
@@ -88,6 +177,8 @@ class GameInterface:
             new_game_state = current_state.make_move(move_to_make)
             self.game.current_state = new_game_state
             current_state = self.game.current_state
+            if record is not None:
+                record.moves.append(move_to_make)
 
             print("{} made the move {}. The game's state is now:".format(
                 current_player_name, move_to_make))
@@ -101,31 +192,71 @@ class GameInterface:
         else:
             print("It's a tie!")
 
+        if writer is not None:
+            writer.write(record)
+
 
 if __name__ == '__main__':
-    games = ", ".join(["'{}': {}".format(key, playable_games[key].__name__) if
-                       playable_games[key] is not None else
-                       "'{}': None".format(key) for key in playable_games])
-
-    strategies = ", ".join(["'{}': {}".format(key,
-                                              usable_strategies[key].__name__)
-                            if usable_strategies[key] is not None else
-                            "'{}': None".format(key)
-                            for key in usable_strategies])
-
-    chosen_game = ''
-    while chosen_game not in playable_games.keys():
+    import argparse
+    parser = argparse.ArgumentParser(description='Play a game.')
+    parser.add_argument('--game', choices=list(playable_games))
+    parser.add_argument('--size', type=int,
+                        help='the board size, or the starting total of '
+                             'Subtract Square')
+    parser.add_argument('--p1', choices=list(usable_strategies),
+                        help="Player 1's strategy")
+    parser.add_argument('--p2', choices=list(usable_strategies),
+                        help="Player 2's strategy")
+    parser.add_argument('--first', type=int, choices=[1, 2],
+                        help='the player who moves first')
+    parser.add_argument('--record',
+                        help='a file to append the record of the game to')
+    parser.add_argument('--max-nodes', type=int,
+                        help='the most nodes a search may expand exactly '
+                             'before it falls back on heuristic search')
+    parser.add_argument('--max-entries', type=int,
+                        help='the most scores a search may keep in memory')
+    args = parser.parse_args()
+
+    games = ", ".join("'{}': {}".format(key, playable_games.name(key))
+                      for key in playable_games)
+    strategies = ", ".join("'{}': {}".format(key, usable_strategies.name(key))
+                           for key in usable_strategies)
+
+    chosen_game = args.game or ''
+    while chosen_game not in playable_games:
         chosen_game = input(
             "Select the game you want to play ({}): ".format(games))
+    if args.size is not None:
+        from game_record import check_param
+        try:
+            check_param(chosen_game, args.size)
+        except ValueError as error:
+            parser.error(str(error))
 
-    p1 = ''
-    p2 = ''
+    p1 = args.p1 or ''
+    p2 = args.p2 or ''
 
-    while p1 not in usable_strategies.keys():
+    while p1 not in usable_strategies:
         p1 = input("Select the strategy for Player 1 ({}): ".format(strategies))
 
-    while p2 not in usable_strategies.keys():
+    while p2 not in usable_strategies:
         p2 = input("Select the strategy for Player 2 ({}): ".format(strategies))
 
-    GameInterface(playable_games[chosen_game], usable_strategies[p1],
-                  usable_strategies[p2]).play()
+    p1_strategy, p2_strategy = usable_strategies[p1], usable_strategies[p2]
+    if args.max_nodes is not None or args.max_entries is not None:
+        from search_budget import SearchBudget
+        p1_strategy = budgeted(p1_strategy, SearchBudget(args.max_nodes,
+                                                         args.max_entries))
+        p2_strategy = budgeted(p2_strategy, SearchBudget(args.max_nodes,
+                                                         args.max_entries))
+    interface = GameInterface(playable_games[chosen_game],
+                              p1_strategy, p2_strategy,
+                              None if args.first is None else args.first == 1,
+                              args.size)
+    if args.record is None:
+        interface.play()
+    else:
+        from game_record import RecordWriter
+        with RecordWriter(args.record) as record_writer:
+            interface.play(record_writer)
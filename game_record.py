@@ -0,0 +1,254 @@
+"""
+Records of played games, and replay of positions from them.
+
+A record is one line of text: the game's key (as in playable_games), the
+game's parameter (the board size for Stonehenge, the starting total for
+Subtract Square), the first player (1 or 2) and the moves. Stonehenge moves
+are single letters written without separators; Subtract Square moves are
+separated by commas. For example, 'h 2 1 AFDE' is a game of Stonehenge on a
+board of size 2 where Player 1 moved first and played A and D.
+
+Replay applies the moves with make_move directly, without validating or
+rendering them, so positions can be reconstructed from millions of records
+far faster than by playing the games again.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from game import Game
+from game_state import GameState
+from stonehenge import MAX_SIZE, StonehengeGame
+from subtract_square_game import SubtractSquareGame
+
+# The game class, move separator and move parser for each game key.
+_GAME_TYPES: Dict[str, type] = {'h': StonehengeGame,
+                                's': SubtractSquareGame}
+_SEPARATORS: Dict[str, str] = {'h': '', 's': ','}
+_PARSERS: Dict[str, Callable[[str], Any]] = {'h': str, 's': int}
+
+# The smallest and largest parameter of each game, or None for no largest.
+PARAM_RANGES: Dict[str, Tuple[int, Optional[int]]] = {'h': (1, MAX_SIZE),
+                                                      's': (1, None)}
+
+
+def check_param(game_key: str, param: int) -> None:
+    """
+    Raise a ValueError if param is out of range for the game with game_key.
+
+    >>> check_param('h', 3)
+    >>> check_param('h', 9)
+    Traceback (most recent call last):
+    ...
+    ValueError: 9 is out of range for game h
+    """
+    lowest, highest = PARAM_RANGES.get(game_key, (1, None))
+    if param < lowest or (highest is not None and param > highest):
+        raise ValueError('{} is out of range for game {}'.format(param,
+                                                                 game_key))
+
+
+class GameRecord:
+    """
+    The record of a game.
+
+    game_key - the key of the game played, 'h' or 's'
+    param - the board size or starting total of the game
+    p1_starts - whether Player 1 made the first move
+    moves - the moves made, in order
+    """
+    game_key: str
+    param: int
+    p1_starts: bool
+    moves: List[Any]
+
+    def __init__(self, game_key: str, param: int, p1_starts: bool,
+                 moves: Optional[List[Any]] = None) -> None:
+        """
+        Initialize this GameRecord.
+
+        Raise a ValueError if game_key is not a recordable game or param is
+        out of range for it.
+
+        >>> GameRecord('h', 2, True).moves
+        []
+        """
+        if game_key not in _GAME_TYPES:
+            raise ValueError('unknown game {}'.format(game_key))
+        check_param(game_key, param)
+        self.game_key = game_key
+        self.param = param
+        self.p1_starts = p1_starts
+        self.moves = list(moves) if moves is not None else []
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        Return whether this GameRecord records the same game as other.
+
+        >>> GameRecord('s', 5, True, [4]) == GameRecord('s', 5, True, [4])
+        True
+        """
+        return type(other) is type(self) and self.to_line() == other.to_line()
+
+    def to_line(self) -> str:
+        """
+        Return this GameRecord as a line of text, without a newline.
+
+        >>> GameRecord('h', 2, True, ['A', 'F', 'D', 'E']).to_line()
+        'h 2 1 AFDE'
+        >>> GameRecord('s', 18, False, [16, 1, 1]).to_line()
+        's 18 2 16,1,1'
+        """
+        moves = _SEPARATORS[self.game_key].join(str(move) for move in
+                                                self.moves)
+        return '{} {} {} {}'.format(self.game_key, self.param,
+                                    1 if self.p1_starts else 2, moves).rstrip()
+
+    @classmethod
+    def from_line(cls, line: str) -> 'GameRecord':
+        """
+        Return the GameRecord written as line by to_line.
+
+        Raise a ValueError if line is not a game record, or records a game
+        that cannot be played.
+
+        >>> GameRecord.from_line('s 18 2 16,1,1').moves
+        [16, 1, 1]
+        >>> GameRecord.from_line('h 2 1').moves
+        []
+        >>> GameRecord.from_line('h 9 1 A')
+        Traceback (most recent call last):
+        ...
+        ValueError: 9 is out of range for game h
+        """
+        fields = line.split()
+        if len(fields) not in (3, 4) or fields[2] not in ('1', '2'):
+            raise ValueError('{!r} is not a game record'.format(line))
+        game_key = fields[0]
+        record = cls(game_key, int(fields[1]), fields[2] == '1')
+        if len(fields) == 4:
+            separator = _SEPARATORS[game_key]
+            parts = fields[3].split(separator) if separator else fields[3]
+            record.moves = [_PARSERS[game_key](part) for part in parts]
+        return record
+
+    def new_game(self) -> Game:
+        """
+        Return a new game of the kind recorded, before any move was made.
+
+        >>> GameRecord('h', 3, False).new_game().current_state.p1_turn
+        False
+        """
+        return _GAME_TYPES[self.game_key](self.p1_starts, self.param)
+
+
+def record_for(game: Game) -> GameRecord:
+    """
+    Return an empty GameRecord for game, which must not have had any move
+    made yet.
+
+    >>> record_for(StonehengeGame(True, 3)).to_line()
+    'h 3 1'
+    """
+    for game_key, game_type in _GAME_TYPES.items():
+        if isinstance(game, game_type):
+            if game_key == 'h':
+                param = game.size
+            else:
+                param = game.current_state.current_total
+            return GameRecord(game_key, param,
+                              game.current_state.p1_turn)
+    raise ValueError('games of type {} cannot be recorded'.format(
+        type(game).__name__))
+
+
+def replay(record: GameRecord, ply: Optional[int] = None) -> GameState:
+    """
+    Return the position after the first ply moves of record, or after all of
+    them if ply is None.
+
+    >>> record = GameRecord.from_line('h 2 1 AFDE')
+    >>> replay(record, 2).cells
+    [1, 'B', 'C', 'D', 'E', 2, 'G']
+    >>> replay(record).get_current_player_name()
+    'p1'
+    """
+    state = record.new_game().current_state
+    for move in record.moves[:ply]:
+        state = state.make_move(move)
+    return state
+
+
+def positions(record: GameRecord) -> Iterator[GameState]:
+    """
+    Yield every position of record, starting with the initial position.
+
+    >>> [state.current_total for state in
+    ...  positions(GameRecord.from_line('s 6 1 4,1,1'))]
+    [6, 2, 1, 0]
+    """
+    state = record.new_game().current_state
+    yield state
+    for move in record.moves:
+        state = state.make_move(move)
+        yield state
+
+
+class RecordWriter:
+    """
+    Appends game records to a file.
+
+    path - the file records are appended to
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the file at path for appending records.
+        """
+        self.path = path
+        self._file = open(path, 'a')
+
+    def __enter__(self) -> 'RecordWriter':
+        """
+        Return this RecordWriter.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Close this RecordWriter.
+        """
+        self.close()
+
+    def write(self, record: GameRecord) -> None:
+        """
+        Append record to the file.
+        """
+        self._file.write(record.to_line() + '\n')
+
+    def close(self) -> None:
+        """
+        Flush and close the file.
+        """
+        self._file.close()
+
+
+def read_records(path: str) -> Iterator[GameRecord]:
+    """
+    Yield the records in the file at path, one at a time.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'games')
+    >>> with RecordWriter(path) as writer:
+    ...     writer.write(GameRecord('s', 5, True, [4, 1]))
+    ...     writer.write(GameRecord('h', 1, False, ['B']))
+    >>> [record.to_line() for record in read_records(path)]
+    ['s 5 1 4,1', 'h 1 2 B']
+    """
+    with open(path) as records_file:
+        for line in records_file:
+            if line.strip():
+                yield GameRecord.from_line(line)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,72 @@
+"""
+Unittests for game records and replay.
+"""
+import os
+import tempfile
+import unittest
+
+from game_record import GameRecord, RecordWriter, positions, read_records, \
+    replay
+from persistent_cache import state_key
+from stonehenge import StonehengeGame
+from subtract_square_game import SubtractSquareGame
+
+
+def complete_games(game_key, param):
+    """
+    Yield the record and the positions of every complete game of the game
+    with game_key and param, from either starting player.
+
+    A game is complete once no moves are left, not merely once its winner is
+    decided.
+    """
+    game_type = {'h': StonehengeGame, 's': SubtractSquareGame}[game_key]
+    for p1_starts in (True, False):
+        stack = [([], [game_type(p1_starts, param).current_state])]
+        while stack:
+            moves, states = stack.pop()
+            if not states[-1].get_possible_moves():
+                yield GameRecord(game_key, param, p1_starts, moves), states
+                continue
+            for move in states[-1].get_possible_moves():
+                stack.append((moves + [move],
+                              states + [states[-1].make_move(move)]))
+
+
+class GameRecordUnitTests(unittest.TestCase):
+    def test_replay_every_game(self):
+        """
+        Test that every complete game of Stonehenge of sizes 1 and 2, and of
+        Subtract Square from 10, survives writing and reading its record,
+        and that replay and positions give back each of its positions.
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'games')
+        games = [game for game_key, param in [('h', 1), ('h', 2), ('s', 10)]
+                 for game in complete_games(game_key, param)]
+        with RecordWriter(path) as writer:
+            for record, _ in games:
+                writer.write(record)
+        for (record, states), read in zip(games, read_records(path)):
+            self.assertEqual(read, record)
+            self.assertEqual(GameRecord.from_line(record.to_line()), record)
+            expected = [state_key(state) for state in states]
+            self.assertEqual([state_key(state) for state in positions(read)],
+                             expected)
+            for ply, state in enumerate(expected):
+                self.assertEqual(state_key(replay(read, ply)), state)
+            self.assertEqual(state_key(replay(read)), expected[-1])
+        self.assertEqual(len(list(read_records(path))), len(games))
+
+    def test_from_line_rejects_unplayable_records(self):
+        """
+        Test that records of games that cannot be played raise a ValueError
+        instead of failing later in replay.
+        """
+        for line in ['h 9 1 A', 'h 0 1', 's 0 2', 's -4 1 1', 'x 3 1',
+                     'h 2 3 A']:
+            with self.assertRaises(ValueError):
+                GameRecord.from_line(line)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,557 @@
+"""
+An asyncio server that hosts many games at once.
+
+Each client connection plays one game at a time over a line-based protocol.
+Computer players' strategies run in an executor, so a slow search in one
+session does not stall the others. A strategy that takes a SearchBudget is
+given move_timeout seconds to search, after which it finishes with its best
+guess so far; any other strategy runs in a long-lived worker process, which
+is killed and replaced if it takes longer than move_timeout, and a cheap
+fallback strategy chooses that move instead. There are at most max_workers
+such processes; moves wait for one to be free when all are busy.
+
+Client requests:
+    new GAME PARAM FIRST P1 P2  start a game, e.g. 'new h 3 y i mr' plays
+                                Stonehenge of size 3 with Player 1 first,
+                                Player 1 played by the client ('i') and
+                                Player 2 by recursive minimax
+    move MOVE                   make a move for the client's player
+    show                        print the board, followed by a line 'end'
+    quit                        close the connection
+
+Server responses:
+    ok ID                       a game was started
+    turn PLAYER MOVES           the client is to move; MOVES are separated
+                                by commas
+    moved PLAYER MOVE           a move was made
+    over WINNER                 the game is over; WINNER is p1, p2 or tie
+    error MESSAGE               the request was not understood, or asked for
+                                an unknown game or strategy or a size or total
+                                the game does not allow, or a computer
+                                player failed, which ends the game
+
+Usage: python game_server.py [--host HOST] [--port PORT] [--unix PATH]
+                             [--move-timeout SECONDS]
+"""
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import collections
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from game import Game
+from game_interface import playable_games, usable_strategies
+from game_record import check_param
+from search_budget import SearchBudget
+from strategy import rough_outcome_strategy
+
+# The strategy key meaning the client chooses this player's moves.
+REMOTE = 'i'
+
+
+class _StrategyWorker:
+    """
+    A worker process that runs strategies sent to it, one at a time.
+
+    process - the worker process
+    connection - the parent's end of the pipe to process
+    """
+    process: multiprocessing.process.BaseProcess
+    connection: multiprocessing.connection.Connection
+
+    def __init__(self) -> None:
+        """
+        Initialize this _StrategyWorker and start its process.
+
+        The process is spawned rather than forked, since the server forks
+        from a process running an event loop and executor threads.
+        """
+        context = multiprocessing.get_context('spawn')
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve_strategies,
+                                       args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    async def wait_ready(self) -> None:
+        """
+        Wait until the worker process has started up.
+
+        Raise an EOFError if the process died while starting.
+        """
+        await _readable(self.connection, None)
+        self.connection.recv()
+
+    async def run(self, strategy: Callable[[Any], Any], game: Game,
+                  timeout: Optional[float]) -> Tuple[bool, Any]:
+        """
+        Run strategy on game in the worker process, and return whether it
+        succeeded along with the move it chose or the exception it raised.
+
+        Raise an asyncio.TimeoutError if it takes longer than timeout
+        seconds, and an EOFError or OSError if the process died.
+        """
+        self.connection.send((strategy, game))
+        await _readable(self.connection, timeout)
+        return self.connection.recv()
+
+    def stop(self) -> None:
+        """
+        Kill the worker process.
+        """
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+def _serve_strategies(connection: multiprocessing.connection.Connection) -> \
+        None:
+    """
+    Run the strategies sent over connection on the games sent with them, and
+    send back each move chosen, until connection is closed.
+    """
+    connection.send(None)
+    while True:
+        try:
+            strategy, game = connection.recv()
+        except EOFError:
+            return
+        try:
+            connection.send((True, strategy(game)))
+        except Exception as error:
+            connection.send((False, error))
+
+
+async def _readable(connection: multiprocessing.connection.Connection,
+                    timeout: Optional[float]) -> None:
+    """
+    Wait without blocking the event loop until connection has data or has
+    been closed by the other end.
+
+    Raise an asyncio.TimeoutError if that takes longer than timeout seconds.
+    """
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fileno = connection.fileno()
+    loop.add_reader(fileno, lambda: ready.done() or ready.set_result(None))
+    try:
+        await asyncio.wait_for(ready, timeout)
+    finally:
+        loop.remove_reader(fileno)
+
+
+class GameSession:
+    """
+    A game hosted by the server.
+
+    session_id - the id of this session
+    game - the game being played
+    strategies - the strategy for 'p1' and 'p2', or None if the client chooses
+    that player's moves
+    """
+    session_id: int
+    game: Game
+    strategies: Dict[str, Optional[Callable[[Any], Any]]]
+
+    def __init__(self, session_id: int, game: Game,
+                 strategies: Dict[str, Optional[Callable[[Any], Any]]]) -> \
+            None:
+        """
+        Initialize this GameSession.
+        """
+        self.session_id = session_id
+        self.game = game
+        self.strategies = strategies
+
+    def current_player(self) -> str:
+        """
+        Return the name of the player to move.
+        """
+        return self.game.current_state.get_current_player_name()
+
+    def is_over(self) -> bool:
+        """
+        Return whether the game in this session is over.
+        """
+        return self.game.is_over(self.game.current_state)
+
+    def apply_move(self, move: Any) -> bool:
+        """
+        Make move for the player to move and return True, or return False if
+        move is not valid.
+        """
+        state = self.game.current_state
+        if not state.is_valid_move(move):
+            return False
+        self.game.current_state = state.make_move(move)
+        return True
+
+    def winner(self) -> str:
+        """
+        Return 'p1' or 'p2' if that player has won, or 'tie' otherwise.
+        """
+        for player in ('p1', 'p2'):
+            if self.game.is_winner(player):
+                return player
+        return 'tie'
+
+
+class GameServer:
+    """
+    A server hosting any number of concurrent GameSessions.
+
+    executor - the executor computer players' strategies run in
+    move_timeout - the number of seconds a strategy may take before the
+    fallback strategy is used instead, or None for no limit
+    fallback - the strategy used when a strategy takes too long
+    sessions - the sessions currently being played, by id
+    max_workers - the most worker processes strategies without a budget run
+    in at once when there is a move timeout
+    workers - the idle ones among those worker processes
+    """
+    executor: concurrent.futures.Executor
+    move_timeout: Optional[float]
+    fallback: Callable[[Any], Any]
+    sessions: Dict[int, GameSession]
+    max_workers: int
+    workers: List[_StrategyWorker]
+
+    def __init__(self, executor: Optional[concurrent.futures.Executor] = None,
+                 move_timeout: Optional[float] = None,
+                 fallback: Callable[[Any], Any] = rough_outcome_strategy,
+                 max_workers: Optional[int] = None) -> None:
+        """
+        Initialize this GameServer. If no executor is given, strategies run in
+        a pool of worker processes, which close shuts down. If max_workers is
+        not given, there is a worker process per CPU.
+
+        Raise a ValueError if max_workers is less than 1.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor()
+        self.executor = executor
+        self.move_timeout = move_timeout
+        self.fallback = fallback
+        self.sessions = {}
+        self.max_workers = max_workers
+        self.workers = []
+        self._ids = itertools.count(1)
+        self._started_workers = 0
+        self._waiting = collections.deque()
+
+    def close(self) -> None:
+        """
+        Stop the idle worker processes of this GameServer, and shut down the
+        process pool it created, waiting for its workers to exit. An executor
+        that was given is left running.
+        """
+        while self.workers:
+            self.workers.pop().stop()
+            self._started_workers -= 1
+        if self._owns_executor:
+            self.executor.shutdown()
+
+    async def _acquire_worker(self) -> _StrategyWorker:
+        """
+        Return an idle worker process, starting one if fewer than
+        max_workers are running, or else waiting until one is released.
+        """
+        while not self.workers and self._started_workers >= self.max_workers:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiting.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Pass on the release this waiter was woken by.
+                    self._wake_waiter()
+                raise
+            finally:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+        if self.workers:
+            return self.workers.pop()
+        self._started_workers += 1
+        try:
+            worker = _StrategyWorker()
+        except BaseException:
+            self._started_workers -= 1
+            self._wake_waiter()
+            raise
+        try:
+            await worker.wait_ready()
+        except BaseException:
+            self._release_worker(worker, False)
+            raise
+        return worker
+
+    def _release_worker(self, worker: _StrategyWorker, healthy: bool) -> \
+            None:
+        """
+        Make worker idle again if it is healthy, or stop it otherwise, and
+        wake a move waiting for a worker.
+        """
+        if healthy:
+            self.workers.append(worker)
+        else:
+            worker.stop()
+            self._started_workers -= 1
+        self._wake_waiter()
+
+    def _wake_waiter(self) -> None:
+        """
+        Wake the move that has waited longest for a worker, if any.
+        """
+        while self._waiting:
+            waiter = self._waiting.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def new_session(self, game_key: str, param: int, p1_starts: bool,
+                    p1_key: str, p2_key: str) -> GameSession:
+        """
+        Start and return a new session playing the game with key game_key
+        (see playable_games) with strategies p1_key and p2_key (see
+        usable_strategies, where REMOTE means the client plays).
+
+        Raise a ValueError if a key is unknown or param is out of range for
+        the game.
+        """
+        if game_key not in playable_games:
+            raise ValueError('unknown game {}'.format(game_key))
+        check_param(game_key, param)
+        strategies = {}
+        for player, key in (('p1', p1_key), ('p2', p2_key)):
+            if key == REMOTE:
+                strategies[player] = None
+            elif key in usable_strategies:
+                strategies[player] = usable_strategies[key]
+            else:
+                raise ValueError('unknown strategy {}'.format(key))
+        game = playable_games[game_key](p1_starts, param)
+        session = GameSession(next(self._ids), game, strategies)
+        self.sessions[session.session_id] = session
+        return session
+
+    def end_session(self, session: GameSession) -> None:
+        """
+        Stop hosting session.
+        """
+        self.sessions.pop(session.session_id, None)
+
+    async def run_strategy(self, strategy: Callable[[Any], Any],
+                           session: GameSession) -> Any:
+        """
+        Return the move strategy chooses for session, computed in the
+        executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, strategy,
+                                          session.game)
+
+    async def choose_move(self, session: GameSession) -> Any:
+        """
+        Return the move chosen by the strategy of the player to move in
+        session.
+
+        A strategy that takes a budget searches in the executor within
+        move_timeout seconds. Any other strategy runs in an idle worker
+        process, or a new one if none is idle and fewer than max_workers are
+        running, and otherwise waits for a worker to be released. A worker
+        that takes longer than move_timeout seconds is killed, and the
+        fallback, computed in the executor, chooses the move instead. An
+        exception raised by the strategy is raised here.
+        """
+        strategy = session.strategies[session.current_player()]
+        if self.move_timeout is None:
+            return await self.run_strategy(strategy, session)
+        if 'budget' in inspect.signature(strategy).parameters:
+            budget = SearchBudget(max_seconds=self.move_timeout)
+            return await self.run_strategy(
+                functools.partial(strategy, budget=budget), session)
+        worker = await self._acquire_worker()
+        try:
+            succeeded, value = await worker.run(strategy, session.game,
+                                                self.move_timeout)
+        except (asyncio.TimeoutError, EOFError, OSError):
+            self._release_worker(worker, False)
+            return await self.run_strategy(self.fallback, session)
+        except BaseException:
+            # Cancelled partway through a move, so the worker is still busy.
+            self._release_worker(worker, False)
+            raise
+        self._release_worker(worker, True)
+        if not succeeded:
+            raise value
+        return value
+
+    async def play_computer_moves(self, session: GameSession,
+                                  writer: asyncio.StreamWriter) -> None:
+        """
+        Make moves for computer players in session until the game is over or
+        the client is to move, and report them to writer.
+
+        Raise a ValueError if the fallback strategy chooses an invalid move.
+        """
+        while not session.is_over():
+            player = session.current_player()
+            if session.strategies[player] is None:
+                moves = session.game.current_state.get_possible_moves()
+                _send(writer, 'turn {} {}'.format(
+                    player, ','.join(str(move) for move in moves)))
+                return
+            move = await self.choose_move(session)
+            if not session.apply_move(move):
+                move = await self.run_strategy(self.fallback, session)
+                if not session.apply_move(move):
+                    raise ValueError('the fallback strategy chose invalid '
+                                     'move {}'.format(move))
+            _send(writer, 'moved {} {}'.format(player, move))
+        _send(writer, 'over {}'.format(session.winner()))
+
+    async def _play(self, session: GameSession,
+                    writer: asyncio.StreamWriter) -> bool:
+        """
+        Play the computer moves of session, reporting them to writer, and
+        return True. If a strategy fails, report the error, end session and
+        return False.
+        """
+        try:
+            await self.play_computer_moves(session, writer)
+        except Exception as error:
+            _send(writer, 'error {}'.format(error))
+            self.end_session(session)
+            return False
+        return True
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """
+        Serve the requests of one client until it quits or disconnects.
+        """
+        session = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = line.decode().split()
+                if not request:
+                    continue
+                command, args = request[0], request[1:]
+                if command == 'quit':
+                    break
+                elif command == 'new' and len(args) == 5:
+                    if session is not None:
+                        self.end_session(session)
+                        session = None
+                    try:
+                        session = self.new_session(args[0], int(args[1]),
+                                                   args[2].lower() == 'y',
+                                                   args[3], args[4])
+                    except ValueError as error:
+                        _send(writer, 'error {}'.format(error))
+                    else:
+                        _send(writer, 'ok {}'.format(session.session_id))
+                        if not await self._play(session, writer):
+                            session = None
+                elif session is None:
+                    _send(writer, 'error no game in progress')
+                elif command == 'show':
+                    _send(writer, str(session.game.current_state))
+                    _send(writer, 'end')
+                elif command == 'move' and len(args) == 1:
+                    try:
+                        move = session.game.str_to_move(args[0])
+                    except ValueError:
+                        move = None
+                    if session.is_over() or \
+                            session.strategies[session.current_player()] \
+                            is not None or not session.apply_move(move):
+                        _send(writer, 'error invalid move {}'.format(args[0]))
+                    else:
+                        _send(writer, 'moved {} {}'.format(
+                            _previous_player(session), move))
+                        if not await self._play(session, writer):
+                            session = None
+                else:
+                    _send(writer, 'error unknown request {}'.format(
+                        ' '.join(request)))
+                await writer.drain()
+        finally:
+            if session is not None:
+                self.end_session(session)
+            writer.close()
+
+    async def serve_tcp(self, host: str = '127.0.0.1', port: int = 0) -> \
+            asyncio.AbstractServer:
+        """
+        Return a server accepting clients on host and port.
+        """
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        """
+        Return a server accepting clients on the Unix socket at path.
+        """
+        return await asyncio.start_unix_server(self.handle_client, path)
+
+
+def _send(writer: asyncio.StreamWriter, message: str) -> None:
+    """
+    Write the line message to writer.
+    """
+    writer.write((message + '\n').encode())
+
+
+def _previous_player(session: GameSession) -> str:
+    """
+    Return the name of the player who made the last move in session.
+    """
+    return 'p2' if session.current_player() == 'p1' else 'p1'
+
+
+async def _main(host: str, port: int, unix_path: Optional[str],
+                move_timeout: Optional[float]) -> None:
+    """
+    Run a GameServer giving strategies move_timeout seconds a move until
+    interrupted.
+    """
+    game_server = GameServer(move_timeout=move_timeout)
+    try:
+        if unix_path is not None:
+            server = await game_server.serve_unix(unix_path)
+        else:
+            server = await game_server.serve_tcp(host, port)
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Host games over a socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None,
+                        help='serve on this Unix socket instead of TCP')
+    parser.add_argument('--move-timeout', type=float, default=None,
+                        metavar='SECONDS',
+                        help='the longest a computer player may take to '
+                             'choose a move (default: no limit)')
+    arguments = parser.parse_args()
+    if arguments.move_timeout is not None and arguments.move_timeout <= 0:
+        parser.error('--move-timeout must be positive')
+    asyncio.run(_main(arguments.host, arguments.port, arguments.unix,
+                      arguments.move_timeout))
@@ -0,0 +1,260 @@
+"""
+Unittests for the asyncio game server.
+"""
+import asyncio
+import concurrent.futures
+import time
+import unittest
+
+from game_interface import usable_strategies
+from game_server import GameServer, GameSession
+from stonehenge import StonehengeGame
+from subtract_square_game import SubtractSquareGame
+
+
+def slow_strategy(game):
+    """
+    Return the first move of game after taking far longer than any move
+    timeout in these tests.
+    """
+    time.sleep(60)
+    return game.current_state.get_possible_moves()[0]
+
+
+def failing_strategy(game):
+    """
+    Raise a ValueError instead of choosing a move.
+    """
+    raise ValueError('no move')
+
+
+def invalid_strategy(game):
+    """
+    Return a move that is never valid in Subtract Square.
+    """
+    return -1
+
+
+class _Writer:
+    """
+    A stand-in for an asyncio.StreamWriter that keeps what is written.
+    """
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+
+async def play(port, new_request, moves):
+    """
+    Connect to the server on port, start a game with new_request, make moves
+    whenever it is the client's turn and return every line the server sent.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write((new_request + '\n').encode())
+    lines = []
+    moves = list(moves)
+    while True:
+        line = (await reader.readline()).decode().strip()
+        lines.append(line)
+        if line.startswith('turn'):
+            writer.write('move {}\n'.format(moves.pop(0)).encode())
+        elif line.startswith('over') or line.startswith('error'):
+            break
+    writer.write(b'quit\n')
+    writer.close()
+    await writer.wait_closed()
+    return lines
+
+
+class GameServerUnitTests(unittest.TestCase):
+    def run_server(self, *clients, move_timeout=None):
+        """
+        Run a server with a thread pool executor and return the lines sent to
+        each of clients, which are (new_request, moves) pairs.
+        """
+        async def main():
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                game_server = GameServer(executor, move_timeout)
+                server = await game_server.serve_tcp()
+                port = server.sockets[0].getsockname()[1]
+                async with server:
+                    results = await asyncio.gather(
+                        *[play(port, request, moves)
+                          for request, moves in clients])
+                return results
+        return asyncio.run(main())
+
+    def test_remote_against_minimax(self):
+        """
+        Test a client playing Subtract Square against recursive minimax.
+        """
+        lines, = self.run_server(('new s 5 y i mr', ['4']))
+        self.assertEqual(lines, ['ok 1', 'turn p1 1,4', 'moved p1 4',
+                                 'moved p2 1', 'over p2'])
+
+    def test_concurrent_sessions(self):
+        """
+        Test that several games can be played at once.
+        """
+        results = self.run_server(('new h 1 y i ro', ['A']),
+                                  ('new s 4 n i mi', []),
+                                  ('new h 2 y mr mi', []))
+        self.assertEqual(results[0][-2:], ['moved p1 A', 'over p1'])
+        self.assertEqual(results[1][-2:], ['moved p2 4', 'over p2'])
+        self.assertTrue(results[2][-1].startswith('over'))
+
+    def test_invalid_requests(self):
+        """
+        Test that unknown games and strategies are reported as errors.
+        """
+        lines, = self.run_server(('new x 1 y i mr', []))
+        self.assertEqual(lines, ['error unknown game x'])
+
+    def test_out_of_range_parameters(self):
+        """
+        Test that board sizes and totals the games do not allow are reported
+        as errors.
+        """
+        results = self.run_server(('new h 7 y i mr', []),
+                                  ('new h 0 y i mr', []),
+                                  ('new s -3 y i mr', []))
+        self.assertEqual(results, [['error 7 is out of range for game h'],
+                                   ['error 0 is out of range for game h'],
+                                   ['error -3 is out of range for game s']])
+
+    def test_move_timeout_bounds_searches(self):
+        """
+        Test that searches that take a budget finish soon after the move
+        timeout instead of running on in the executor.
+        """
+        lines, = self.run_server(('new h 4 y mr sv', []), move_timeout=0.05)
+        self.assertTrue(lines[-1].startswith('over'))
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            game_server = GameServer(executor, 0.05)
+            for key in ['mr', 'mi', 'sv', 'ts']:
+                session = GameSession(1, StonehengeGame(True, 5),
+                                      {'p1': usable_strategies[key]})
+                start = time.monotonic()
+                move = asyncio.run(game_server.choose_move(session))
+                self.assertLess(time.monotonic() - start, 0.3, key)
+                self.assertTrue(session.apply_move(move))
+
+    def test_move_timeout_kills_other_strategies(self):
+        """
+        Test that a strategy that takes no budget is stopped at the move
+        timeout and replaced by the fallback.
+        """
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            game_server = GameServer(executor, 0.2)
+            session = GameSession(1, SubtractSquareGame(True, 10),
+                                  {'p1': slow_strategy})
+            start = time.monotonic()
+            move = asyncio.run(game_server.choose_move(session))
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertTrue(session.apply_move(move))
+            self.assertEqual(game_server.workers, [])
+
+    def test_workers_are_reused(self):
+        """
+        Test that strategies without a budget share one worker process until
+        one of them overruns the move timeout.
+        """
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            game_server = GameServer(executor, 5)
+            try:
+                pids = []
+                for _ in range(3):
+                    session = GameSession(1, StonehengeGame(True, 2),
+                                          {'p1': usable_strategies['ro']})
+                    move = asyncio.run(game_server.choose_move(session))
+                    self.assertTrue(session.apply_move(move))
+                    worker, = game_server.workers
+                    pids.append(worker.process.pid)
+                self.assertEqual(len(set(pids)), 1)
+
+                game_server.move_timeout = 0.2
+                session = GameSession(1, SubtractSquareGame(True, 10),
+                                      {'p1': slow_strategy})
+                asyncio.run(game_server.choose_move(session))
+                self.assertEqual(game_server.workers, [])
+                self.assertFalse(worker.process.is_alive())
+            finally:
+                game_server.close()
+
+    def test_workers_are_capped(self):
+        """
+        Test that moves wait for a free worker once max_workers are running,
+        and that a strategy that raises leaves its worker running.
+        """
+        async def choose_moves(game_server, count):
+            sessions = [GameSession(1, StonehengeGame(True, 2),
+                                    {'p1': usable_strategies['ro']})
+                        for _ in range(count)]
+            return await asyncio.gather(*[game_server.choose_move(session)
+                                          for session in sessions])
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            game_server = GameServer(executor, 5, max_workers=2)
+            try:
+                moves = asyncio.run(choose_moves(game_server, 6))
+                self.assertEqual(len(moves), 6)
+                self.assertEqual(len(game_server.workers), 2)
+
+                session = GameSession(1, SubtractSquareGame(True, 10),
+                                      {'p1': failing_strategy})
+                with self.assertRaisesRegex(ValueError, 'no move'):
+                    asyncio.run(game_server.choose_move(session))
+                self.assertEqual(len(game_server.workers), 2)
+                self.assertTrue(all(worker.process.is_alive()
+                                    for worker in game_server.workers))
+            finally:
+                game_server.close()
+
+    def test_close_shuts_down_own_pool(self):
+        """
+        Test that closing a server shuts down the process pool it created,
+        but not an executor it was given.
+        """
+        game_server = GameServer()
+        game_server.close()
+        with self.assertRaises(RuntimeError):
+            game_server.executor.submit(int)
+
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            GameServer(executor).close()
+            self.assertEqual(executor.submit(int).result(), 0)
+
+    def test_failing_strategy_is_reported(self):
+        """
+        Test that a computer player that fails is reported to the client as
+        an error, and its game is ended.
+        """
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            game_server = GameServer(executor, fallback=invalid_strategy)
+            session = game_server.new_session('s', 10, True, 'i', 'i')
+            session.strategies['p1'] = failing_strategy
+            writer = _Writer()
+            self.assertFalse(asyncio.run(game_server._play(session, writer)))
+        self.assertEqual(writer.data, b'error no move\n')
+        self.assertEqual(game_server.sessions, {})
+
+    def test_invalid_fallback_move(self):
+        """
+        Test that an invalid move from the fallback is reported as an error
+        instead of being retried forever.
+        """
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            game_server = GameServer(executor, fallback=invalid_strategy)
+            session = GameSession(1, SubtractSquareGame(True, 10),
+                                  {'p1': invalid_strategy,
+                                   'p2': invalid_strategy})
+            with self.assertRaises(ValueError):
+                asyncio.run(game_server.play_computer_moves(session,
+                                                            _Writer()))
+
+
+if __name__ == "__main__":
+    unittest.main()
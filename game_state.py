@@ -3,7 +3,8 @@ The GameState superclass.
 
 NOTE: You do not have to run python-ta on this file.
 """
-from typing import Any
+from typing import Any, Iterator, Optional
+from search_stats import SearchStats
 
 
 class GameState:
@@ -40,6 +41,23 @@ class GameState:
         """
         raise NotImplementedError
 
+    def get_search_moves(self) -> list:
+        """
+        Return the moves a search needs to try from this state: a subset of
+        the possible moves such that every possible move leads to the same
+        outcome as one of them. By default, all of the possible moves.
+        """
+        return self.get_possible_moves()
+
+    def iter_moves(self) -> Iterator[Any]:
+        """
+        Yield the moves of get_search_moves one at a time, those most likely
+        to be best first, so that a search which stops at the first winning
+        move generates as few moves as possible. By default, the moves are
+        yielded in the order of get_search_moves.
+        """
+        yield from self.get_search_moves()
+
     def get_current_player_name(self) -> str:
         """
         Return 'p1' if the current player is Player 1, and 'p2' if the current
@@ -68,10 +86,24 @@ class GameState:
         """
         raise NotImplementedError
 
-    def rough_outcome(self) -> float:
+    def outcome(self) -> Optional[int]:
+        """
+        Return the score of this state for the current player (WIN, LOSE or
+        DRAW) if the game is over at this state, or None if it is not.
+
+        By default, a state with no possible moves is over and lost by the
+        current player, since the previous player made the last move.
+        """
+        if self.get_possible_moves():
+            return None
+        return self.LOSE
+
+    def rough_outcome(self, stats: Optional[SearchStats] = None,
+                      depth: int = 0) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
-        player can guarantee from state self.
+        player can guarantee from state self. If stats is given, record the
+        states the estimate looks at in it, counting self as being at depth.
         """
         raise NotImplementedError
 
@@ -0,0 +1,271 @@
+"""
+An opening book for Stonehenge.
+
+The first few plies on any board are the most expensive positions to search
+and are always the same, so the best move for every position within the
+first few plies is computed once, offline, and stored in a compact binary
+book file, in which a position is found by bisection. book_strategy wraps
+any strategy so that it consults the book before falling back to search.
+
+Usage: python opening_book.py SIZE PLIES PATH [STRATEGY]
+
+where STRATEGY is a key of game_interface.usable_strategies, 'sv' (the
+solver) by default.
+"""
+import struct
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from stonehenge import MAX_SIZE, StonehengeGame, StonehengeState, \
+    get_geometry
+from solver import solver_strategy
+
+MAGIC = b'SHOB'
+VERSION = 1
+# The magic bytes, the version, the board size, the plies covered and the
+# number of positions.
+HEADER = struct.Struct('<4sBBHI')
+
+
+def position_key(state: StonehengeState) -> bytes:
+    """
+    Return the key used to store state in an opening book: its binary
+    encoding (see StonehengeState.to_bytes), which has the same length for
+    every state of a board size.
+
+    The key records the cells, the ley-line claims and the player to move,
+    since two positions with the same cells can differ in who claimed a
+    ley-line first.
+
+    >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
+    >>> state = StonehengeState(True, cells, ['@'] * 9)
+    >>> position_key(state).hex()
+    '0a00000000'
+    >>> position_key(state.make_move('A')).hex()
+    '0201400040'
+    """
+    return state.to_bytes()
+
+
+class OpeningBook:
+    """
+    A table of precomputed best moves for the opening positions of a
+    Stonehenge board.
+
+    The positions are kept as one table of fixed-width records, each a
+    position key followed by the index of the cell to claim, sorted by key,
+    so a book is saved and loaded without conversion and a position is
+    found by bisection.
+
+    size - the side length of the board the book was generated for
+    plies - the number of plies from the empty board covered by the book
+    """
+    size: int
+    plies: int
+
+    def __init__(self, size: int, plies: int,
+                 moves: Optional[Dict[bytes, str]] = None) -> None:
+        """
+        Initialize this OpeningBook for a board of side length size covering
+        the first plies plies, with moves mapping position keys to the best
+        move in that position.
+
+        >>> book = OpeningBook(2, 1)
+        >>> list(book.items())
+        []
+        """
+        self.size = size
+        self.plies = plies
+        geometry = get_geometry(size)
+        self._key_length = geometry.encoded_length
+        self._width = self._key_length + 1
+        moves = {} if moves is None else moves
+        self._table = b''.join(
+            key + bytes([geometry.cell_index[moves[key]]])
+            for key in sorted(moves))
+
+    def __len__(self) -> int:
+        """
+        Return the number of positions stored in this OpeningBook.
+
+        >>> state = StonehengeGame(True, 2).current_state
+        >>> len(OpeningBook(2, 1, {position_key(state): 'A'}))
+        1
+        """
+        return len(self._table) // self._width
+
+    def _key(self, index: int) -> bytes:
+        """
+        Return the position key of the record at index in the table.
+        """
+        start = index * self._width
+        return self._table[start:start + self._key_length]
+
+    def _move(self, index: int) -> str:
+        """
+        Return the move of the record at index in the table.
+        """
+        cell = self._table[index * self._width + self._key_length]
+        return get_geometry(self.size).cell_names[cell]
+
+    def items(self) -> Iterator[Tuple[bytes, str]]:
+        """
+        Yield the position key and move of every position in this
+        OpeningBook, in key order.
+
+        >>> state = StonehengeGame(True, 1).current_state
+        >>> book = OpeningBook(1, 0, {position_key(state): 'B'})
+        >>> [(key.hex(), move) for key, move in book.items()]
+        [('09000000', 'B')]
+        """
+        for index in range(len(self)):
+            yield self._key(index), self._move(index)
+
+    def lookup(self, state: StonehengeState) -> Optional[str]:
+        """
+        Return the book move for state, or None if state is not in this
+        OpeningBook.
+
+        >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
+        >>> state = StonehengeState(True, cells, ['@'] * 9)
+        >>> book = OpeningBook(2, 1, {position_key(state): 'A'})
+        >>> book.lookup(state)
+        'A'
+        >>> book.lookup(state.make_move('A')) is None
+        True
+        """
+        if state.size != self.size:
+            return None
+        key = position_key(state)
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._key(low) == key:
+            return self._move(low)
+        return None
+
+    def save(self, path: str) -> None:
+        """
+        Write this OpeningBook to the file at path.
+
+        The file holds a header (the magic bytes MAGIC, a version number,
+        the board size, the plies and the number of positions) followed by
+        the table of records.
+        """
+        with open(path, 'wb') as book_file:
+            book_file.write(HEADER.pack(MAGIC, VERSION, self.size,
+                                        self.plies, len(self)))
+            book_file.write(self._table)
+
+    @classmethod
+    def load(cls, path: str) -> 'OpeningBook':
+        """
+        Return the OpeningBook stored in the file at path.
+
+        Raise a ValueError if the file is not an opening book.
+        """
+        with open(path, 'rb') as book_file:
+            data = book_file.read()
+        if len(data) < HEADER.size:
+            raise ValueError('{} is not an opening book'.format(path))
+        magic, version, size, plies, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or \
+                not 1 <= size <= MAX_SIZE or len(data) != HEADER.size + \
+                count * (get_geometry(size).encoded_length + 1):
+            raise ValueError('{} is not an opening book'.format(path))
+        book = cls(size, plies)
+        book._table = data[HEADER.size:]
+        return book
+
+
+def opening_positions(size: int, plies: int) -> List[StonehengeState]:
+    """
+    Return every position that is not over and can be reached within plies
+    plies of an empty board of side length size, for either starting player.
+
+    >>> len(opening_positions(1, 1))
+    2
+    >>> len(opening_positions(2, 1))
+    16
+    """
+    frontier = []
+    for p1_starts in (True, False):
+        frontier.append(StonehengeGame(p1_starts, size).current_state)
+
+    seen = {}
+    for ply in range(plies + 1):
+        next_frontier = []
+        for state in frontier:
+            key = position_key(state)
+            if key in seen or not state.get_possible_moves():
+                continue
+            seen[key] = state
+            if ply < plies:
+                next_frontier.extend(state.make_move(move) for move in
+                                     state.get_possible_moves())
+        frontier = next_frontier
+    return list(seen.values())
+
+
+def generate_book(size: int, plies: int,
+                  strategy: Callable[[Any], Any] = solver_strategy) -> \
+        OpeningBook:
+    """
+    Return an OpeningBook for a board of side length size holding the move
+    strategy chooses in every position within the first plies plies. The
+    solver is used by default, since it finds the best move and reuses the
+    positions it solves from one book position to the next.
+
+    >>> book = generate_book(2, 1)
+    >>> len(book)
+    16
+    >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
+    >>> book.lookup(StonehengeState(True, cells, ['@'] * 9)) in cells
+    True
+    """
+    game = StonehengeGame(True, size)
+    moves = {}
+    for state in opening_positions(size, plies):
+        game.current_state = state
+        moves[position_key(state)] = strategy(game)
+    return OpeningBook(size, plies, moves)
+
+
+def book_strategy(book: OpeningBook,
+                  fallback: Callable[[Any], Any] = solver_strategy) -> \
+        Callable[[Any], Any]:
+    """
+    Return a strategy that plays the move stored in book for the game's
+    current state, and uses fallback for positions not in the book.
+
+    >>> game = StonehengeGame(True, 1)
+    >>> book = OpeningBook(1, 0, {position_key(game.current_state): 'B'})
+    >>> book_strategy(book)(game)
+    'B'
+    """
+    def strategy(game: Any) -> Any:
+        """
+        Return the book move for game, or the move chosen by fallback.
+        """
+        state = game.current_state
+        if isinstance(state, StonehengeState) and state.size == book.size:
+            move = book.lookup(state)
+            if move is not None:
+                return move
+        return fallback(game)
+
+    return strategy
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) in (4, 5):
+        from game_interface import usable_strategies
+        chosen = usable_strategies[sys.argv[4] if len(sys.argv) == 5 else 'sv']
+        generate_book(int(sys.argv[1]), int(sys.argv[2]),
+                      chosen).save(sys.argv[3])
+    else:
+        from python_ta import check_all
+        check_all(config="a2_pyta.txt")
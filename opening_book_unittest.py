@@ -0,0 +1,61 @@
+"""
+Unittests for opening books.
+"""
+import os
+import tempfile
+import unittest
+
+from opening_book import OpeningBook, generate_book, opening_positions
+from solver import Solver
+from strategy import minimax_strategy_r
+
+
+class OpeningBookUnitTests(unittest.TestCase):
+    def test_save_and_load(self):
+        """
+        Test that a book written by save is read back unchanged by load.
+        """
+        book = generate_book(2, 2)
+        path = os.path.join(tempfile.mkdtemp(), 'book')
+        book.save(path)
+        loaded = OpeningBook.load(path)
+        self.assertEqual((loaded.size, loaded.plies), (2, 2))
+        self.assertEqual(list(loaded.items()), list(book.items()))
+        for state in opening_positions(2, 2):
+            self.assertEqual(loaded.lookup(state), book.lookup(state))
+            self.assertIsNotNone(loaded.lookup(state))
+
+    def test_load_rejects_other_files(self):
+        """
+        Test that loading a file that is not a book raises a ValueError.
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'book')
+        with open(path, 'w') as other:
+            other.write('solve-checkpoint 2 7 0123\n')
+        with self.assertRaises(ValueError):
+            OpeningBook.load(path)
+
+        generate_book(1, 1).save(path)
+        with open(path, 'rb') as book_file:
+            data = book_file.read()
+        with open(path, 'wb') as book_file:
+            book_file.write(data[:-1])
+        with self.assertRaises(ValueError):
+            OpeningBook.load(path)
+
+    def test_solver_book_agrees_with_minimax(self):
+        """
+        Test that the default book holds moves as good as minimax's, that
+        is, moves whose solved scores are the same.
+        """
+        book = generate_book(2, 1)
+        minimax_book = generate_book(2, 1, minimax_strategy_r)
+        solver = Solver()
+        for state in opening_positions(2, 1):
+            self.assertEqual(
+                solver.score(state.make_move(book.lookup(state))),
+                solver.score(state.make_move(minimax_book.lookup(state))))
+
+
+if __name__ == "__main__":
+    unittest.main()
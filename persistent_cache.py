@@ -0,0 +1,207 @@
+"""
+A disk-backed cache of state scores shared by search processes.
+
+The cache is a fixed-size open-addressing hash table stored in a file and
+memory-mapped by every process that opens it, so scores computed by one
+worker are seen by the others and survive restarts. Keys are reduced to
+64-bit hashes, so distinct states collide with probability about 2 ** -64
+per pair.
+
+File layout: a 16-byte header (the magic bytes MAGIC, a version number and
+the number of slots), followed by 16-byte slots, each holding the key hash
+(0 for an empty slot) and the score. Writers hold an exclusive lock on the
+file while claiming a slot; readers do not lock. A writer stores the score
+before the key hash, so a reader that sees a key also sees its score.
+
+Each process must open the cache itself rather than use one opened before
+it was forked: an flock taken through an inherited file descriptor is shared
+with the parent, so it would not keep their writes apart.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+from typing import Any, Optional
+
+MAGIC = b'SHPC'
+VERSION = 1
+HEADER = struct.Struct('<4sIQ')
+SLOT = struct.Struct('<Qb7x')
+# The number of slots looked at before giving up on a key.
+MAX_PROBES = 32
+
+
+def state_key(state: Any) -> bytes:
+    """
+    Return the key under which the score of state is cached. States with a
+    binary encoding (see StonehengeState.to_bytes) are keyed on it, which is
+    much cheaper than rendering their repr.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> state_key(SubtractSquareState(True, 5))
+    b"SubtractSquareState:P1's Turn: True - Total: 5"
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 1).current_state
+    >>> state_key(state) == b'StonehengeState:' + state.to_bytes()
+    True
+    """
+    name = type(state).__name__
+    if hasattr(state, 'to_bytes'):
+        return name.encode() + b':' + state.to_bytes()
+    return '{}:{}'.format(name, repr(state)).encode()
+
+
+def _hash(key: bytes) -> int:
+    """
+    Return the non-zero 64-bit hash of key.
+    """
+    value = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                           'little')
+    return value or 1
+
+
+class PersistentCache:
+    """
+    A memory-mapped table from keys to scores. It may only be written to by
+    the process that opened it.
+
+    path - the file holding the table
+    capacity - the number of slots in the table
+    """
+    path: str
+    capacity: int
+
+    def __init__(self, path: str, capacity: int = 1 << 20) -> None:
+        """
+        Open the cache stored at path, creating it with capacity slots if it
+        does not exist. An existing cache keeps its own capacity.
+
+        Raise a ValueError if path holds something other than a cache.
+        """
+        self.path = path
+        self._pid = os.getpid()
+        self._map = None
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size == 0:
+                    os.ftruncate(self._fd, HEADER.size + capacity * SLOT.size)
+                    os.write(self._fd, HEADER.pack(MAGIC, VERSION, capacity))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            if os.fstat(self._fd).st_size < HEADER.size:
+                raise ValueError('{} is not a score cache'.format(path))
+            self._map = mmap.mmap(self._fd, 0)
+            magic, version, capacity = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION or \
+                    len(self._map) != HEADER.size + capacity * SLOT.size:
+                raise ValueError('{} is not a score cache'.format(path))
+        except BaseException:
+            self.close()
+            raise
+        self.capacity = capacity
+
+    def __enter__(self) -> 'PersistentCache':
+        """
+        Return this PersistentCache.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Close this PersistentCache.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmap and close the file holding this PersistentCache.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _offset(self, slot: int) -> int:
+        """
+        Return the position of slot in the file.
+        """
+        return HEADER.size + slot * SLOT.size
+
+    def get(self, key: bytes) -> Optional[int]:
+        """
+        Return the score stored for key, or None if there is none.
+
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'scores')
+        >>> with PersistentCache(path, 64) as cache:
+        ...     cache.get(b'state') is None
+        True
+        """
+        target = _hash(key)
+        for probe in range(min(MAX_PROBES, self.capacity)):
+            offset = self._offset((target + probe) % self.capacity)
+            stored, score = SLOT.unpack_from(self._map, offset)
+            if stored == target:
+                return score
+            if stored == 0:
+                return None
+        return None
+
+    def put(self, key: bytes, score: int) -> bool:
+        """
+        Store score for key and return True, or return False if the slots
+        key may be stored in are all taken.
+
+        Raise a RuntimeError if this PersistentCache was opened by another
+        process, which this one was forked from.
+
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'scores')
+        >>> with PersistentCache(path, 64) as cache:
+        ...     cache.put(b'state', -1)
+        True
+        >>> with PersistentCache(path) as cache:
+        ...     cache.get(b'state'), cache.capacity
+        (-1, 64)
+        """
+        if os.getpid() != self._pid:
+            raise RuntimeError('{} was opened by another process; open it '
+                               'again in this one'.format(self.path))
+        target = _hash(key)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            for probe in range(min(MAX_PROBES, self.capacity)):
+                offset = self._offset((target + probe) % self.capacity)
+                stored = SLOT.unpack_from(self._map, offset)[0]
+                if stored in (0, target):
+                    # The score byte follows the 8-byte key hash.
+                    struct.pack_into('<b', self._map, offset + 8, score)
+                    struct.pack_into('<Q', self._map, offset, target)
+                    return True
+            return False
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        """
+        Return the number of keys stored in this PersistentCache.
+
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'scores')
+        >>> with PersistentCache(path, 64) as cache:
+        ...     _ = cache.put(b'a', 1), cache.put(b'b', 0), cache.put(b'a', 1)
+        ...     len(cache)
+        2
+        """
+        return sum(1 for slot in range(self.capacity)
+                   if SLOT.unpack_from(self._map, self._offset(slot))[0])
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,207 @@
+"""
+Dense ranking of Stonehenge positions.
+
+rank maps every position that can arise in play on a board of a given size
+to a distinct integer in range(position_count(size)), and unrank maps it
+back, so positions can index plain arrays in tablebases, caches and work
+queues instead of hash tables.
+
+Players alternate, so the number of cells each player holds differs by at
+most one, and when the counts differ the player to move is fixed. Positions
+are grouped by (cells held by p1, cells held by p2, player to move); within
+a group, the set of occupied cells and then the subset of those held by p1
+are ranked with the combinatorial number system.
+
+Ley-line claims follow from the cells, except for a ley-line where both
+players hold half of the cells: it belongs to whoever got there first. The
+rank does not include this, so unrank gives such ley-lines to p1 unless the
+bits from tie_bits for the position are passed to it.
+"""
+import bisect
+from math import comb
+from typing import Dict, List, Tuple
+from stonehenge import StonehengeState, get_geometry
+
+# The groups of a board size, as parallel lists sorted by offset.
+_GroupTable = Tuple[List[int], List[Tuple[int, int, bool]]]
+_GROUPS: Dict[int, _GroupTable] = {}
+_OFFSETS: Dict[int, Dict[Tuple[int, int, bool], int]] = {}
+_COUNTS: Dict[int, int] = {}
+
+
+def _build_groups(size: int) -> None:
+    """
+    Compute the offset of every group of positions on a board with side
+    length size.
+    """
+    n = len(get_geometry(size).cell_names)
+    starts = []
+    groups = []
+    offsets = {}
+    total = 0
+    for k1 in range(n + 1):
+        for k2 in range(max(0, k1 - 1), min(k1 + 1, n - k1) + 1):
+            for p1_turn in (True, False):
+                if (k1 > k2 and p1_turn) or (k2 > k1 and not p1_turn):
+                    continue
+                starts.append(total)
+                groups.append((k1, k2, p1_turn))
+                offsets[(k1, k2, p1_turn)] = total
+                total += comb(n, k1 + k2) * comb(k1 + k2, k1)
+    _GROUPS[size] = (starts, groups)
+    _OFFSETS[size] = offsets
+    _COUNTS[size] = total
+
+
+def position_count(size: int) -> int:
+    """
+    Return the number of distinct ranks of positions on a board with side
+    length size.
+
+    >>> position_count(1)
+    26
+    >>> position_count(5) < 3 ** 25
+    True
+    """
+    if size not in _COUNTS:
+        _build_groups(size)
+    return _COUNTS[size]
+
+
+def _subset_rank(subset: List[int]) -> int:
+    """
+    Return the rank of the sorted list of distinct non-negative integers
+    subset among all subsets of the same length, in colexicographic order.
+
+    >>> [_subset_rank(s) for s in ([0, 1], [0, 2], [1, 2], [0, 3])]
+    [0, 1, 2, 3]
+    """
+    return sum(comb(element, i + 1) for i, element in enumerate(subset))
+
+
+def _subset_unrank(rank_: int, k: int) -> List[int]:
+    """
+    Return the sorted subset of length k with colexicographic rank rank_.
+
+    >>> [_subset_unrank(r, 2) for r in range(4)]
+    [[0, 1], [0, 2], [1, 2], [0, 3]]
+    """
+    subset = []
+    for i in range(k, 0, -1):
+        element = i - 1
+        while comb(element + 1, i) <= rank_:
+            element += 1
+        rank_ -= comb(element, i)
+        subset.append(element)
+    subset.reverse()
+    return subset
+
+
+def rank(state: StonehengeState) -> int:
+    """
+    Return the rank of state among the positions on its board.
+
+    Raise a ValueError if the players' cell counts could not arise in play.
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 1).current_state
+    >>> rank(state), rank(StonehengeGame(False, 1).current_state)
+    (0, 1)
+    >>> sorted(rank(state.make_move(move)) for move in 'ABC')
+    [5, 6, 7]
+    """
+    occupied = [i for i, cell in enumerate(state.cells) if type(cell) is int]
+    p1_cells = [j for j, i in enumerate(occupied) if state.cells[i] == 1]
+    k1 = len(p1_cells)
+    k2 = len(occupied) - k1
+    offsets = _OFFSETS.get(state.size)
+    if offsets is None:
+        position_count(state.size)
+        offsets = _OFFSETS[state.size]
+    group = (k1, k2, state.p1_turn)
+    if group not in offsets:
+        raise ValueError('{} cells for p1 and {} for p2 with {} to move '
+                         'cannot arise in play'.format(
+                             k1, k2, state.get_current_player_name()))
+    return offsets[group] + _subset_rank(occupied) * comb(k1 + k2, k1) + \
+        _subset_rank(p1_cells)
+
+
+def _tied_lines(size: int, cells: List) -> List[int]:
+    """
+    Return the indices of the ley-lines in which both players hold enough
+    cells to claim them.
+    """
+    geometry = get_geometry(size)
+    tied = []
+    for i, line in enumerate(geometry.ley_lines):
+        owners = [cells[j] for j in line]
+        if min(owners.count(1), owners.count(2)) >= geometry.thresholds[i]:
+            tied.append(i)
+    return tied
+
+
+def tie_bits(state: StonehengeState) -> int:
+    """
+    Return the bits unrank needs to restore who claimed each ley-line in
+    which both players hold half of the cells: bit j is set if the j-th such
+    ley-line belongs to p2.
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 1).current_state
+    >>> tie_bits(state.make_move('B').make_move('C'))
+    0
+    >>> state = StonehengeGame(False, 1).current_state
+    >>> tie_bits(state.make_move('B').make_move('C'))
+    1
+    """
+    bits = 0
+    for j, line in enumerate(_tied_lines(state.size, state.cells)):
+        if state.ley_line_scores[line] == 2:
+            bits |= 1 << j
+    return bits
+
+
+def unrank(index: int, size: int, ties: int = 0) -> StonehengeState:
+    """
+    Return the position with rank index on a board with side length size.
+    Ley-lines both players could claim go to the owner given by the bits
+    ties (see tie_bits).
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(False, 2).current_state
+    >>> state = state.make_move('C').make_move('G')
+    >>> repr(unrank(rank(state), 2)) == repr(state)
+    True
+    """
+    if index < 0 or index >= position_count(size):
+        raise ValueError('{} is not the rank of a position on a board of '
+                         'size {}'.format(index, size))
+    starts, groups = _GROUPS[size]
+    position = bisect.bisect_right(starts, index) - 1
+    k1, k2, p1_turn = groups[position]
+    index -= starts[position]
+    occupied_rank, p1_rank = divmod(index, comb(k1 + k2, k1))
+    occupied = _subset_unrank(occupied_rank, k1 + k2)
+    p1_cells = {occupied[j] for j in _subset_unrank(p1_rank, k1)}
+
+    geometry = get_geometry(size)
+    cells = list(geometry.cell_names)
+    for i in occupied:
+        cells[i] = 1 if i in p1_cells else 2
+
+    scores = ['@'] * len(geometry.ley_lines)
+    for i, line in enumerate(geometry.ley_lines):
+        owners = [cells[j] for j in line]
+        if owners.count(1) >= geometry.thresholds[i]:
+            scores[i] = 1
+        elif owners.count(2) >= geometry.thresholds[i]:
+            scores[i] = 2
+    for j, line in enumerate(_tied_lines(size, cells)):
+        scores[line] = 2 if ties >> j & 1 else 1
+    return StonehengeState(p1_turn, cells, scores)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
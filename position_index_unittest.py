@@ -0,0 +1,44 @@
+"""
+Unittests for the dense ranking of Stonehenge positions.
+"""
+import unittest
+
+from position_index import position_count, rank, tie_bits, unrank
+from stonehenge_unittest import reachable_states
+
+
+class PositionIndexUnitTests(unittest.TestCase):
+    def test_rank_round_trip(self):
+        """
+        Test that every reachable state of sizes 1 and 2 is given back by
+        unrank from its rank and tie bits, and that no two of them share
+        both.
+        """
+        for size in (1, 2):
+            states = reachable_states(size)
+            indices = set()
+            for key, state in states.items():
+                index = rank(state)
+                self.assertIn(index, range(position_count(size)))
+                ties = tie_bits(state)
+                indices.add((index, ties))
+                self.assertEqual(repr(unrank(index, size, ties)), key)
+            self.assertEqual(len(indices), len(states))
+
+    def test_ranks_are_a_bijection(self):
+        """
+        Test that rank undoes unrank for every rank of sizes 1 and 2, so
+        ranks and positions correspond one to one, and that ranks outside
+        the range are rejected.
+        """
+        for size in (1, 2):
+            count = position_count(size)
+            for index in range(count):
+                self.assertEqual(rank(unrank(index, size)), index)
+            for index in (-1, count):
+                with self.assertRaises(ValueError):
+                    unrank(index, size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,253 @@
+"""
+A lightweight profiler for the hot methods of games and states.
+
+A MethodProfiler replaces methods such as make_move, get_possible_moves and
+is_over with wrappers that count calls and time them, so search time can be
+attributed to individual state operations in a running process without an
+external profiler. With sample_every = n, only every n-th tree of profiled
+calls (a call made outside any other profiled method, and every profiled
+call under it) is timed and the times are scaled up, which keeps the
+overhead low on live workers while a sampled method's own time still
+excludes all of its profiled callees.
+
+Results can be written as a table of the call count and cumulative time of
+each method, or in the collapsed-stack format read by flame graph tools:
+one line per call stack of profiled methods, such as
+'StonehengeState.rough_outcome;StonehengeState.make_move 1234', where the
+number is the time spent in the last method of the stack itself, in
+microseconds.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# The methods wrapped by wrap_hot_paths.
+GAME_HOT_PATHS = ('is_over', 'is_winner')
+STATE_HOT_PATHS = ('make_move', 'get_possible_moves', 'is_valid_move',
+                   'rough_outcome', 'outcome')
+
+
+class MethodProfiler:
+    """
+    Call counts and timings of wrapped methods.
+
+    sample_every - only every sample_every-th tree of profiled calls is
+    timed
+    calls - the number of calls of each method, by label
+    sampled_calls - the number of timed calls of each method
+    sampled_time - the seconds spent in the timed calls of each method,
+    including the methods it called
+    stack_time - the estimated seconds spent in each stack of profiled
+    methods, excluding the profiled methods called from it
+    """
+    sample_every: int
+    calls: Dict[str, int]
+    sampled_calls: Dict[str, int]
+    sampled_time: Dict[str, float]
+    stack_time: Dict[Tuple[str, ...], float]
+
+    def __init__(self, sample_every: int = 1) -> None:
+        """
+        Initialize this MethodProfiler with nothing wrapped.
+
+        Raise a ValueError if sample_every is less than 1.
+
+        >>> profiler = MethodProfiler()
+        >>> profiler.calls
+        {}
+        """
+        if sample_every < 1:
+            raise ValueError('sample_every must be at least 1')
+        self.sample_every = sample_every
+        self.calls = {}
+        self.sampled_calls = {}
+        self.sampled_time = {}
+        self.stack_time = {}
+        self._originals = []
+        self._local = threading.local()
+        # Guards the counts and times, which every thread adds to.
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'MethodProfiler':
+        """
+        Return this MethodProfiler.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Restore every method wrapped by this MethodProfiler.
+        """
+        self.unwrap()
+
+    def _frames(self) -> List[List[Any]]:
+        """
+        Return the profiled methods currently running in this thread, each as
+        a [label, seconds spent in profiled callees] pair.
+        """
+        if not hasattr(self._local, 'frames'):
+            self._local.frames = []
+            self._local.trees = 0
+            self._local.sampling = False
+        return self._local.frames
+
+    def wrap(self, cls: type, names: Tuple[str, ...]) -> None:
+        """
+        Replace the methods of cls called names with profiled versions, until
+        unwrap is called.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> with MethodProfiler() as profiler:
+        ...     profiler.wrap(SubtractSquareState, ('get_possible_moves',))
+        ...     SubtractSquareState(True, 5).get_possible_moves()
+        [1, 4]
+        >>> profiler.calls
+        {'SubtractSquareState.get_possible_moves': 1}
+        >>> 'get_possible_moves' in SubtractSquareState.__dict__
+        True
+        """
+        for name in names:
+            self._originals.append((cls, name, cls.__dict__.get(name)))
+            label = '{}.{}'.format(cls.__name__, name)
+            setattr(cls, name, self._wrapper(label, getattr(cls, name)))
+
+    def unwrap(self) -> None:
+        """
+        Restore every method wrapped by this MethodProfiler.
+        """
+        while self._originals:
+            cls, name, original = self._originals.pop()
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+
+    def _wrapper(self, label: str, method: Callable) -> Callable:
+        """
+        Return a version of method that records its calls under label.
+        """
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+            """
+            Call the wrapped method, recording the call.
+            """
+            with self._lock:
+                self.calls[label] = self.calls.get(label, 0) + 1
+            frames = self._frames()
+            if not frames:
+                # A new tree of calls: the first of every sample_every trees
+                # is timed throughout.
+                self._local.sampling = \
+                    self._local.trees % self.sample_every == 0
+                self._local.trees += 1
+            frame = [label, 0.0]
+            frames.append(frame)
+            if not self._local.sampling:
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    frames.pop()
+
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                frames.pop()
+                stack = tuple(caller[0] for caller in frames) + (label,)
+                with self._lock:
+                    self.sampled_calls[label] = \
+                        self.sampled_calls.get(label, 0) + 1
+                    self.sampled_time[label] = \
+                        self.sampled_time.get(label, 0.0) + elapsed
+                    self.stack_time[stack] = \
+                        self.stack_time.get(stack, 0.0) + \
+                        (elapsed - frame[1]) * self.sample_every
+                if frames:
+                    frames[-1][1] += elapsed
+
+        return profiled
+
+    def cumulative_time(self, label: str) -> float:
+        """
+        Return the estimated seconds spent in all calls of the method with
+        label, including the methods it called.
+
+        >>> MethodProfiler().cumulative_time('StonehengeState.make_move')
+        0.0
+        """
+        sampled = self.sampled_calls.get(label, 0)
+        if not sampled:
+            return 0.0
+        return self.sampled_time[label] * self.calls[label] / sampled
+
+    def report(self) -> str:
+        """
+        Return a table of the call counts and cumulative times of every
+        profiled method, slowest first.
+        """
+        labels = sorted(self.calls, key=self.cumulative_time, reverse=True)
+        lines = ['{:<40} {:>10} {:>12}'.format('method', 'calls', 'seconds')]
+        for label in labels:
+            lines.append('{:<40} {:>10} {:>12.6f}'.format(
+                label, self.calls[label], self.cumulative_time(label)))
+        return '\n'.join(lines)
+
+    def write_report(self, path: str) -> None:
+        """
+        Write the table of call counts and cumulative times returned by
+        report to the file at path.
+        """
+        with open(path, 'w') as report_file:
+            report_file.write(self.report() + '\n')
+
+    def collapsed_stacks(self) -> List[str]:
+        """
+        Return the lines of the collapsed-stack representation of the time
+        spent in profiled methods.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> with MethodProfiler() as profiler:
+        ...     profiler.wrap(SubtractSquareState, ('rough_outcome',
+        ...                                         'get_possible_moves'))
+        ...     _ = SubtractSquareState(True, 5).rough_outcome()
+        >>> [line.split()[0] for line in profiler.collapsed_stacks()]
+        ['SubtractSquareState.rough_outcome']
+        """
+        return ['{} {}'.format(';'.join(stack),
+                               int(round(self.stack_time[stack] * 1e6)))
+                for stack in sorted(self.stack_time)]
+
+    def write_collapsed(self, path: str) -> None:
+        """
+        Write the collapsed-stack representation of the time spent in
+        profiled methods to the file at path.
+        """
+        with open(path, 'w') as stacks_file:
+            for line in self.collapsed_stacks():
+                stacks_file.write(line + '\n')
+
+
+def wrap_hot_paths(profiler: MethodProfiler, game: Any) -> None:
+    """
+    Wrap the hot methods of game's class and of its state's class with
+    profiler.
+
+    >>> from stonehenge import StonehengeGame
+    >>> from strategy import minimax_strategy_r
+    >>> game = StonehengeGame(True, 1)
+    >>> with MethodProfiler() as profiler:
+    ...     wrap_hot_paths(profiler, game)
+    ...     minimax_strategy_r(game)
+    'A'
+    >>> profiler.calls['StonehengeState.make_move']
+    3
+    >>> profiler.calls['StonehengeState.outcome']
+    3
+    """
+    profiler.wrap(type(game), GAME_HOT_PATHS)
+    profiler.wrap(type(game.current_state), STATE_HOT_PATHS)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,114 @@
+"""
+Unittests for the method profiler.
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from profiling import MethodProfiler
+
+
+class Tree:
+    """
+    A call tree with known times: outer spends 10ms itself and calls inner
+    twice, and inner spends 10ms itself.
+    """
+    def outer(self):
+        time.sleep(0.01)
+        self.inner()
+        self.inner()
+
+    def inner(self):
+        time.sleep(0.01)
+
+
+class Counted:
+    """
+    A method cheap enough for counting races to show.
+    """
+    def tick(self):
+        pass
+
+
+class MethodProfilerUnitTests(unittest.TestCase):
+    def check_tree(self, sample_every):
+        """
+        Profile six calls of Tree.outer sampling every sample_every-th call
+        tree, and check the self times against the total time.
+        """
+        with MethodProfiler(sample_every) as profiler:
+            profiler.wrap(Tree, ('outer', 'inner'))
+            for _ in range(6):
+                Tree().outer()
+        self.assertEqual(profiler.calls, {'Tree.outer': 6, 'Tree.inner': 12})
+        self.assertEqual(profiler.sampled_calls,
+                         {'Tree.outer': 6 // sample_every,
+                          'Tree.inner': 12 // sample_every})
+        total = profiler.cumulative_time('Tree.outer')
+        self.assertAlmostEqual(sum(profiler.stack_time.values()), total)
+        self.assertAlmostEqual(profiler.cumulative_time('Tree.inner'),
+                               profiler.stack_time[('Tree.outer',
+                                                    'Tree.inner')])
+        self.assertAlmostEqual(profiler.stack_time[('Tree.outer',)] / total,
+                               1 / 3, delta=0.1)
+        self.assertAlmostEqual(total, 0.18, delta=0.1)
+
+    def test_self_time_without_sampling(self):
+        """
+        Test that the self times of a known call tree add up to its total
+        time when every call is timed.
+        """
+        self.check_tree(1)
+
+    def test_self_time_with_sampling(self):
+        """
+        Test that sampling whole call trees scales the self times of callers
+        and callees alike, so they still add up to the total time.
+        """
+        self.check_tree(3)
+
+    def test_sample_every_must_be_positive(self):
+        """
+        Test that sampling fewer than every call tree is rejected.
+        """
+        with self.assertRaises(ValueError):
+            MethodProfiler(0)
+
+    def test_counts_across_threads(self):
+        """
+        Test that calls made from several threads at once are all counted.
+        """
+        def count():
+            for _ in range(100000):
+                Counted().tick()
+
+        with MethodProfiler(4) as profiler:
+            profiler.wrap(Counted, ('tick',))
+            threads = [threading.Thread(target=count) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(profiler.calls, {'Counted.tick': 400000})
+        self.assertEqual(profiler.sampled_calls, {'Counted.tick': 100000})
+
+    def test_write_report(self):
+        """
+        Test that the call counts and cumulative times are written to a file.
+        """
+        with MethodProfiler() as profiler:
+            profiler.wrap(Tree, ('outer', 'inner'))
+            Tree().outer()
+        path = os.path.join(tempfile.mkdtemp(), 'report')
+        profiler.write_report(path)
+        with open(path) as report_file:
+            lines = report_file.read().splitlines()
+        self.assertEqual(lines, profiler.report().splitlines())
+        self.assertEqual([line.split()[:2] for line in lines[1:]],
+                         [['Tree.outer', '1'], ['Tree.inner', '2']])
+
+
+if __name__ == "__main__":
+    unittest.main()
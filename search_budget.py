@@ -0,0 +1,195 @@
+"""
+Limits on the work and memory of a search.
+
+A SearchBudget can be passed to a strategy to bound how many nodes it
+expands, how long it runs and how many scores it keeps in memory. A search
+that runs out of nodes does not fail: every state it would still have
+expanded is scored by rough_outcome instead, so the move it returns is a
+best guess rather than a proven best move. The state searched from is
+always expanded, and only children of expanded nodes are scored this way,
+so a search never costs more than max_nodes + 1 expansions plus one
+rough_outcome per child of them. A search that runs out of time scores the
+unfinished states still waiting on the path it was searching as draws,
+without looking ahead, so it returns soon after max_seconds. A memo table
+that is full evicts its least recently used scores. The budget records
+whether either happened, so callers can tell an exact answer from a
+degraded one.
+"""
+import time
+from typing import List, Optional
+from game_state import GameState
+from search_stats import SearchStats
+
+
+class SearchBudget:
+    """
+    The most work and memory a search may use, and how much it used.
+
+    max_nodes - the most nodes a search may expand exactly, or None for no
+    limit
+    max_entries - the most scores a search may keep in memory, or None for
+    no limit
+    max_seconds - the most seconds a search may expand nodes for, or None for
+    no limit
+    nodes - the number of nodes expanded exactly by the current search
+    degraded - whether the current search scored states heuristically
+    evictions - the number of scores the current search evicted from memory
+    """
+    max_nodes: Optional[int]
+    max_entries: Optional[int]
+    max_seconds: Optional[float]
+    nodes: int
+    degraded: bool
+    evictions: int
+
+    def __init__(self, max_nodes: Optional[int] = None,
+                 max_entries: Optional[int] = None,
+                 max_seconds: Optional[float] = None) -> None:
+        """
+        Initialize this SearchBudget with nothing spent.
+
+        Raise a ValueError if a limit is negative.
+
+        >>> budget = SearchBudget(1000, 500)
+        >>> budget.max_nodes, budget.max_entries
+        (1000, 500)
+        """
+        if any(limit is not None and limit < 0
+               for limit in (max_nodes, max_entries, max_seconds)):
+            raise ValueError('the limits of a budget must not be negative')
+        self.max_nodes = max_nodes
+        self.max_entries = max_entries
+        self.max_seconds = max_seconds
+        self.start()
+
+    def start(self) -> None:
+        """
+        Begin a new search, forgetting what earlier searches spent.
+
+        >>> budget = SearchBudget(0)
+        >>> budget.spend()
+        False
+        >>> budget.start()
+        >>> budget.nodes, budget.degraded
+        (0, False)
+        """
+        self.nodes = 0
+        self.degraded = False
+        self.evictions = 0
+        self._timed_out = False
+        self._deadline = None if self.max_seconds is None else \
+            time.monotonic() + self.max_seconds
+
+    def spend(self) -> bool:
+        """
+        Return whether the current search may expand one more node exactly,
+        counting the node if so. Once the nodes or the time are spent, the
+        search is degraded.
+
+        >>> budget = SearchBudget(1)
+        >>> budget.spend(), budget.spend(), budget.nodes, budget.degraded
+        (True, False, 1, True)
+        >>> SearchBudget(max_seconds=0).spend()
+        False
+        """
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.degraded = True
+            return False
+        if self.out_of_time():
+            self.degraded = self._timed_out = True
+            return False
+        self.nodes += 1
+        return True
+
+    def out_of_time(self) -> bool:
+        """
+        Return whether the current search has run for max_seconds.
+
+        >>> SearchBudget(max_seconds=0).out_of_time()
+        True
+        >>> SearchBudget(max_seconds=60).out_of_time()
+        False
+        """
+        return self._deadline is not None and \
+            time.monotonic() >= self._deadline
+
+    def heuristic_score(self, state: GameState,
+                        stats: Optional[SearchStats] = None,
+                        depth: int = 0) -> float:
+        """
+        Return the score of state for its current player found without
+        expanding it, once the nodes are spent: its rough_outcome, or, once
+        the time is spent, a draw if the game is not over. If stats is
+        given, record the states looked at in it, counting state as being
+        at depth.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> SearchBudget(0).heuristic_score(SubtractSquareState(True, 4))
+        1
+        >>> SearchBudget(max_seconds=0).heuristic_score(
+        ...     SubtractSquareState(True, 4))
+        0
+        >>> from stonehenge import StonehengeGame
+        >>> stats = SearchStats()
+        >>> state = StonehengeGame(True, 1).current_state
+        >>> SearchBudget(0).heuristic_score(state, stats, 1)
+        1
+        >>> stats.terminals
+        1
+        """
+        outcome = state.outcome()
+        if outcome is not None:
+            if stats is not None:
+                stats.terminal()
+            return outcome
+        if self.out_of_time():
+            self.degraded = self._timed_out = True
+            return state.DRAW
+        return state.rough_outcome(stats, depth)
+
+    def evicted(self) -> None:
+        """
+        Record that a score was evicted from memory to stay within
+        max_entries.
+        """
+        self.evictions += 1
+
+    def __str__(self) -> str:
+        """
+        Return a report of what the current search spent, and, if it was
+        degraded, which limits it reached and how it scored the states it
+        could not expand.
+
+        >>> budget = SearchBudget(1, 10)
+        >>> print(budget)
+        nodes: 0 of 1, evictions: 0, exact
+        >>> _ = budget.spend(), budget.spend()
+        >>> budget.evicted()
+        >>> print(budget)
+        nodes: 1 of 1, evictions: 1, degraded to rough_outcome (out of nodes)
+        >>> budget = SearchBudget(max_seconds=0)
+        >>> _ = budget.spend()
+        >>> str(budget).endswith('seconds: 0, evictions: 0, scored unfinished '
+        ...                      'states as draws (out of time)')
+        True
+        """
+        parts: List[str] = [
+            'nodes: {} of {}'.format(self.nodes, 'unlimited'
+                                     if self.max_nodes is None
+                                     else self.max_nodes)]
+        if self.max_seconds is not None:
+            parts.append('seconds: {}'.format(self.max_seconds))
+        parts.append('evictions: {}'.format(self.evictions))
+        if not self.degraded:
+            parts.append('exact')
+        if self.max_nodes is not None and self.nodes >= self.max_nodes and \
+                self.degraded:
+            parts.append('degraded to rough_outcome (out of nodes)')
+        if self._timed_out:
+            parts.append('scored unfinished states as draws (out of time)')
+        return ', '.join(parts)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
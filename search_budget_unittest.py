@@ -0,0 +1,93 @@
+"""
+Unittests for searches run within a SearchBudget.
+"""
+import unittest
+from unittest.mock import patch
+
+from search_budget import SearchBudget
+from search_stats import SearchStats
+from solver import Solver, solver_strategy
+from stonehenge import StonehengeGame, StonehengeState
+from strategy import minimax_strategy_i, minimax_strategy_r
+
+
+class SearchBudgetUnitTests(unittest.TestCase):
+    def test_search_budget_degrades_gracefully(self):
+        """
+        Test that every strategy run out of nodes still returns a legal move
+        and reports that it degraded, that a budget large enough changes
+        nothing, and that a solver over its memory budget evicts scores.
+        """
+        game = StonehengeGame(True, 3)
+        state = game.current_state
+        for search in [minimax_strategy_r, minimax_strategy_i,
+                       solver_strategy]:
+            budget = SearchBudget(max_nodes=200)
+            move = search(game, budget=budget)
+            self.assertTrue(state.is_valid_move(move))
+            self.assertTrue(budget.degraded)
+            self.assertEqual(budget.nodes, 200)
+            self.assertIs(game.current_state, state)
+
+        game = StonehengeGame(True, 2)
+        for search in [minimax_strategy_r, minimax_strategy_i]:
+            budget = SearchBudget(max_nodes=10 ** 6)
+            self.assertEqual(search(game, budget=budget), search(game))
+            self.assertFalse(budget.degraded)
+
+        budget = SearchBudget(max_entries=20)
+        solver = Solver(budget=budget)
+        self.assertEqual(solver.score(game.current_state),
+                         Solver().score(game.current_state))
+        self.assertEqual(len(solver), 20)
+        self.assertGreater(budget.evictions, 0)
+        self.assertFalse(budget.degraded)
+
+    def test_degraded_states_are_counted(self):
+        """
+        Test that the moves rough_outcome makes for a search out of nodes
+        are counted in the search's stats.
+        """
+        game = StonehengeGame(True, 3)
+        make_move = StonehengeState.make_move
+        searches = [lambda stats, budget: minimax_strategy_r(
+                        game, stats, budget=budget),
+                    lambda stats, budget: minimax_strategy_i(
+                        game, stats, budget=budget),
+                    lambda stats, budget: Solver(stats=stats, budget=budget)
+                    .best_move(game.current_state)]
+        for search in searches:
+            calls = []
+
+            def counting_make_move(state, move):
+                calls.append(move)
+                return make_move(state, move)
+            stats = SearchStats()
+            budget = SearchBudget(max_nodes=5)
+            with patch.object(StonehengeState, 'make_move',
+                              counting_make_move):
+                search(stats, budget)
+            self.assertTrue(budget.degraded)
+            self.assertEqual(stats.moves_made, len(calls))
+
+    def test_report_names_how_states_were_scored(self):
+        """
+        Test that a search out of time is reported as scoring its unfinished
+        states as draws, and one out of nodes as using rough_outcome.
+        """
+        game = StonehengeGame(True, 3)
+        budget = SearchBudget(max_seconds=0)
+        minimax_strategy_i(game, budget=budget)
+        self.assertTrue(str(budget).endswith(
+            'scored unfinished states as draws (out of time)'))
+        self.assertNotIn('rough_outcome', str(budget))
+
+        budget = SearchBudget(max_nodes=5)
+        minimax_strategy_i(game, budget=budget)
+        self.assertTrue(str(budget).endswith(
+            'degraded to rough_outcome (out of nodes)'))
+        self.assertNotIn('draws', str(budget))
+
+
+if __name__ == "__main__":
+    unittest.main()
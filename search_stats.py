@@ -0,0 +1,158 @@
+"""
+Instrumentation for the search strategies.
+
+A SearchStats object can be passed to a strategy to record how much work the
+search did. Strategies only touch it when one is given, so searching without
+instrumentation costs one comparison per node.
+"""
+from typing import Dict, List
+
+
+class SearchStats:
+    """
+    Counters describing the work done by a search.
+
+    nodes - the number of states whose children were generated
+    terminals - the number of states found to be over
+    moves_made - the number of calls to make_move
+    cache_hits - the number of states whose score was found in a cache
+    cache_misses - the number of states looked up in a cache but not found
+    nodes_by_depth - the number of nodes expanded at each depth, where the
+    children of the state being searched are at depth 1
+    children_by_depth - the number of children generated at each depth
+    time_by_depth - the wall-clock seconds spent searching the nodes expanded
+    at each depth, including the searches below them, so that depth 0 holds
+    the time of the whole search
+    """
+    nodes: int
+    terminals: int
+    moves_made: int
+    cache_hits: int
+    cache_misses: int
+    nodes_by_depth: Dict[int, int]
+    children_by_depth: Dict[int, int]
+    time_by_depth: Dict[int, float]
+
+    def __init__(self) -> None:
+        """
+        Initialize this SearchStats with every counter at zero.
+
+        >>> stats = SearchStats()
+        >>> stats.nodes, stats.terminals, stats.moves_made
+        (0, 0, 0)
+        """
+        self.nodes = 0
+        self.terminals = 0
+        self.moves_made = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.nodes_by_depth = {}
+        self.children_by_depth = {}
+        self.time_by_depth = {}
+
+    def expanded(self, depth: int, children: int, seconds: float) -> None:
+        """
+        Record that a node at depth had its children children generated and
+        that searching it, including the searches below it, took seconds
+        seconds.
+
+        >>> stats = SearchStats()
+        >>> stats.expanded(0, 3, 0.5)
+        >>> stats.nodes, stats.moves_made, stats.time_by_depth
+        (1, 3, {0: 0.5})
+        """
+        self.nodes += 1
+        self.moves_made += children
+        self.nodes_by_depth[depth] = self.nodes_by_depth.get(depth, 0) + 1
+        self.children_by_depth[depth] = \
+            self.children_by_depth.get(depth, 0) + children
+        self.time_by_depth[depth] = \
+            self.time_by_depth.get(depth, 0.0) + seconds
+
+    def terminal(self) -> None:
+        """
+        Record that a state was found to be over.
+
+        >>> stats = SearchStats()
+        >>> stats.terminal()
+        >>> stats.terminals
+        1
+        """
+        self.terminals += 1
+
+    def cache_lookup(self, hit: bool) -> None:
+        """
+        Record a cache lookup that found a score if hit is True.
+
+        >>> stats = SearchStats()
+        >>> stats.cache_lookup(True)
+        >>> stats.cache_lookup(False)
+        >>> stats.cache_hit_rate()
+        0.5
+        """
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def cache_hit_rate(self) -> float:
+        """
+        Return the fraction of cache lookups that found a score, or 0.0 if
+        there were no lookups.
+
+        >>> SearchStats().cache_hit_rate()
+        0.0
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    def branching_factor(self, depth: int) -> float:
+        """
+        Return the average number of children of the nodes expanded at depth,
+        or 0.0 if no nodes were expanded there.
+
+        >>> stats = SearchStats()
+        >>> stats.expanded(1, 3, 0.0)
+        >>> stats.expanded(1, 2, 0.0)
+        >>> stats.branching_factor(1)
+        2.5
+        >>> stats.branching_factor(2)
+        0.0
+        """
+        nodes = self.nodes_by_depth.get(depth, 0)
+        return self.children_by_depth.get(depth, 0) / nodes if nodes else 0.0
+
+    def depths(self) -> List[int]:
+        """
+        Return the depths at which nodes were expanded, in increasing order.
+        """
+        return sorted(self.nodes_by_depth)
+
+    def __str__(self) -> str:
+        """
+        Return a report of the counters in this SearchStats.
+
+        >>> stats = SearchStats()
+        >>> stats.expanded(0, 2, 0.25)
+        >>> stats.terminal()
+        >>> print(stats)
+        nodes: 1, terminals: 1, moves made: 2
+        cache hits: 0, cache misses: 0, hit rate: 0.00
+        depth 0: 1 nodes, branching factor 2.00, 0.250000s
+        """
+        lines = ['nodes: {}, terminals: {}, moves made: {}'.format(
+            self.nodes, self.terminals, self.moves_made),
+                 'cache hits: {}, cache misses: {}, hit rate: {:.2f}'.format(
+                     self.cache_hits, self.cache_misses,
+                     self.cache_hit_rate())]
+        for depth in self.depths():
+            lines.append('depth {}: {} nodes, branching factor {:.2f}, '
+                         '{:.6f}s'.format(depth, self.nodes_by_depth[depth],
+                                          self.branching_factor(depth),
+                                          self.time_by_depth[depth]))
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,206 @@
+"""
+An exact solver for any game whose states implement the GameState API.
+
+The solver runs negamax directly on states: the outcome of a finished game
+comes from GameState.outcome, so the Game object is never touched. Scores
+are memoized by persistent_cache.state_key in a bounded least-recently-used
+table, which a lock lets threads share, and the search of a state stops as
+soon as a winning move is found, before the remaining moves are generated. A
+SearchBudget bounds the size of the table and the number of states solved
+exactly.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+from game_state import GameState
+from persistent_cache import state_key
+from search_budget import SearchBudget
+from search_stats import SearchStats
+
+
+class Solver:
+    """
+    A memoized negamax solver.
+
+    max_entries - the most scores kept in the memo table
+    key - the function mapping a state to its key in the memo table
+    stats - the SearchStats recording the work done, or None
+    budget - the SearchBudget the searches stay within, or None
+    """
+    max_entries: int
+    key: Callable[[GameState], Hashable]
+    stats: Optional[SearchStats]
+    budget: Optional[SearchBudget]
+
+    def __init__(self, max_entries: int = 1 << 20,
+                 key: Callable[[GameState], Hashable] = state_key,
+                 stats: Optional[SearchStats] = None,
+                 budget: Optional[SearchBudget] = None) -> None:
+        """
+        Initialize this Solver with an empty memo table. If budget limits
+        the scores kept in memory, the table holds at most that many.
+
+        Starting each search in budget is left to the caller. Once its nodes
+        are spent, states are scored by its heuristic search, so scores are
+        no longer exact, and they are not memoized.
+
+        >>> Solver(10).max_entries
+        10
+        >>> Solver(10, budget=SearchBudget(max_entries=5)).max_entries
+        5
+        """
+        if budget is not None and budget.max_entries is not None:
+            max_entries = min(max_entries, budget.max_entries)
+        self.max_entries = max_entries
+        self.key = key
+        self.stats = stats
+        self.budget = budget
+        self._memo = OrderedDict()
+        # Guards _memo, so that one Solver can serve searches in many
+        # threads.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """
+        Return the number of scores in the memo table.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> solver = Solver()
+        >>> solver.score(SubtractSquareState(True, 3))
+        1
+        >>> len(solver)
+        3
+        """
+        with self._lock:
+            return len(self._memo)
+
+    def clear(self) -> None:
+        """
+        Empty the memo table.
+        """
+        with self._lock:
+            self._memo.clear()
+
+    def _lookup(self, key: Hashable) -> Optional[int]:
+        """
+        Return the memoized score for key, or None if there is none.
+        """
+        with self._lock:
+            score = self._memo.get(key)
+            if score is not None:
+                self._memo.move_to_end(key)
+        if self.stats is not None:
+            self.stats.cache_lookup(score is not None)
+        return score
+
+    def _store(self, key: Hashable, score: int) -> None:
+        """
+        Memoize score for key, evicting the least recently used score if the
+        table is full.
+        """
+        with self._lock:
+            self._memo[key] = score
+            evicted = len(self._memo) > self.max_entries
+            if evicted:
+                self._memo.popitem(last=False)
+        if evicted and self.budget is not None:
+            self.budget.evicted()
+
+    def score(self, state: GameState, depth: int = 0) -> float:
+        """
+        Return the score of state for its current player with perfect play,
+        where state is depth moves below the state being solved.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> Solver().score(SubtractSquareState(True, 18))
+        1
+        >>> Solver().score(SubtractSquareState(True, 2))
+        -1
+        """
+        outcome = state.outcome()
+        if outcome is not None:
+            if self.stats is not None:
+                self.stats.terminal()
+            return outcome
+
+        key = self.key(state)
+        score = self._lookup(key)
+        if score is not None:
+            return score
+        if self.budget is not None and not self.budget.spend():
+            return self.budget.heuristic_score(state, self.stats, depth)
+
+        # Moves are generated one at a time, so none are generated after a
+        # winning move is found.
+        if self.stats is not None:
+            start = time.perf_counter()
+        children = 0
+        score = GameState.LOSE
+        for move in state.iter_moves():
+            children += 1
+            score = max(score, -self.score(state.make_move(move), depth + 1))
+            if score == GameState.WIN:
+                break
+        if self.stats is not None:
+            self.stats.expanded(depth, children, time.perf_counter() - start)
+        if self.budget is None or not self.budget.degraded:
+            self._store(key, score)
+        return score
+
+    def best_move(self, state: GameState) -> Any:
+        """
+        Return the first of the best moves from state, or None if the game is
+        over at state.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> Solver().best_move(SubtractSquareState(True, 18))
+        1
+        """
+        if self.stats is not None:
+            start = time.perf_counter()
+        best_move = None
+        best_score = GameState.LOSE - 1
+        children = 0
+        for move in state.get_search_moves():
+            children += 1
+            score = -self.score(state.make_move(move), 1)
+            if score > best_score:
+                best_move, best_score = move, score
+                if score == GameState.WIN:
+                    break
+        if self.stats is not None and children:
+            self.stats.expanded(0, children, time.perf_counter() - start)
+        return best_move
+
+
+# The solver used by solver_strategy, shared between calls so that positions
+# solved for one move are reused for the next.
+_SHARED_SOLVER = Solver()
+
+
+def solver_strategy(game: Any, budget: Optional[SearchBudget] = None) -> Any:
+    """
+    Return a move for game by solving its current state exactly. If budget
+    is given, a search is started in it and a solver of its own, which stays
+    within it, is used instead of the shared one.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> for move in ['A', 'F', 'D']:
+    ...     game.current_state = game.current_state.make_move(move)
+    >>> solver_strategy(game)
+    'E'
+    >>> budget = SearchBudget(max_nodes=0)
+    >>> solver_strategy(game, budget), budget.degraded
+    ('E', True)
+    """
+    if budget is None:
+        return _SHARED_SOLVER.best_move(game.current_state)
+    budget.start()
+    return Solver(budget=budget).best_move(game.current_state)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,51 @@
+"""
+Unittests for the memoized negamax solver.
+"""
+import concurrent.futures
+import sys
+import unittest
+
+from solver import Solver
+from stonehenge import StonehengeGame
+from strategy import minimax_strategy_r
+from subtract_square_game import SubtractSquareGame
+
+
+class SolverUnitTests(unittest.TestCase):
+    def test_solver_agrees_with_minimax(self):
+        """
+        Test that the memoized solver picks the same moves as minimax on the
+        positions of the basic minimax unittests, for both games.
+        """
+        game = StonehengeGame(False, 3)
+        for move in ['K', 'A', 'C', 'B', 'F', 'E', 'G', 'D', 'I']:
+            game.current_state = game.current_state.make_move(move)
+        self.assertEqual(Solver().best_move(game.current_state),
+                         minimax_strategy_r(game))
+
+        game = SubtractSquareGame(True, 18)
+        self.assertEqual(Solver().best_move(game.current_state),
+                         minimax_strategy_r(game))
+
+    def test_shared_solver_in_threads(self):
+        """
+        Test that a solver whose memo table is constantly evicting gives the
+        right scores when threads share it.
+        """
+        solver = Solver(max_entries=64)
+        states = [SubtractSquareGame(True, total).current_state
+                  for total in range(100, 400)]
+        expected = [Solver().score(state) for state in states]
+        # Switching threads often makes a race in the table likely to show.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                self.assertEqual(list(executor.map(solver.score, states)),
+                                 expected)
+        finally:
+            sys.setswitchinterval(interval)
+
+
+if __name__ == "__main__":
+    unittest.main()
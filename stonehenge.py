@@ -1,9 +1,205 @@
 """
 An implementation of the Stonehenge game and its state.
 """
-from typing import Any, List, Union
+import math
+import time
+import types
+from typing import Any, Iterator, List, Mapping, Optional, Tuple, Union
 from game import Game
 from game_state import GameState
+from search_stats import SearchStats
+
+# The largest board whose cells can all be named with a single letter.
+MAX_SIZE = 5
+
+
+class BoardGeometry:
+    """
+    The layout of a Stonehenge board of a certain size. The layout never
+    changes, so it is built once per size and shared by every game and state
+    on boards of that size. Cells and ley-lines are referred to by their index
+    into a state's cells and ley_line_scores respectively.
+
+    size - the side length of the board
+    cell_names - the name of each cell
+    cell_index - a read-only mapping from cell names to cell indices
+    rows - the cell indices of each row, from top to bottom
+    left_lines - the cell indices of each down-left ley-line
+    right_lines - the cell indices of each down-right ley-line
+    ley_lines - the cell indices of each ley-line, in the same order as
+    ley_line_scores
+    cell_lines - the indices of the ley-lines passing through each cell
+    cell_line_masks - a bitmask of the ley-lines through each cell
+    thresholds - the number of cells needed to claim each ley-line
+    line_masks - a bitmask of the cells in each ley-line
+    line_needs - the whole number of cells needed to claim each ley-line
+    max_need - the largest of line_needs
+    longer_lines - the number of ley-lines needing more than i cells, for
+    each i from 0 to max_need
+    win_threshold - the number of ley-lines needed to win
+    encoded_length - the number of bytes in the binary encoding of a state
+    """
+    size: int
+    cell_names: Tuple[str, ...]
+    cell_index: Mapping[str, int]
+    rows: Tuple[Tuple[int, ...], ...]
+    left_lines: Tuple[Tuple[int, ...], ...]
+    right_lines: Tuple[Tuple[int, ...], ...]
+    ley_lines: Tuple[Tuple[int, ...], ...]
+    cell_lines: Tuple[Tuple[int, ...], ...]
+    cell_line_masks: Tuple[int, ...]
+    thresholds: Tuple[float, ...]
+    line_masks: Tuple[int, ...]
+    line_needs: Tuple[int, ...]
+    max_need: int
+    longer_lines: Tuple[int, ...]
+    win_threshold: float
+    encoded_length: int
+
+    def __init__(self, size: int) -> None:
+        """
+        Build the layout of a board with side length size.
+
+        >>> geometry = BoardGeometry(2)
+        >>> geometry.cell_names
+        ('A', 'B', 'C', 'D', 'E', 'F', 'G')
+        >>> geometry.rows
+        ((0, 1), (2, 3, 4), (5, 6))
+        >>> geometry.ley_lines[:3]
+        ((0, 2), (1, 3, 5), (4, 6))
+        >>> geometry.cell_lines[0]
+        (0, 4, 8)
+        >>> geometry.win_threshold
+        4.5
+        >>> geometry.encoded_length
+        5
+        """
+        self.size = size
+        self.cell_names = tuple(chr(ord('A') + i) for i in
+                                range(cell_count(size)))
+        self.cell_index = types.MappingProxyType(
+            {name: i for i, name in enumerate(self.cell_names)})
+        self.rows = _build_rows(size)
+        self.left_lines = _build_diagonals(self.rows, size, 'left')
+        self.right_lines = _build_diagonals(self.rows, size, 'right')
+        self.ley_lines = self.left_lines + self.right_lines + \
+            tuple(reversed(self.rows))
+        self.cell_lines = tuple(
+            tuple(i for i, line in enumerate(self.ley_lines) if cell in line)
+            for cell in range(len(self.cell_names)))
+        self.cell_line_masks = tuple(sum(1 << i for i in lines)
+                                     for lines in self.cell_lines)
+        self.thresholds = tuple(len(line) / 2 for line in self.ley_lines)
+        self.line_masks = tuple(sum(1 << cell for cell in line)
+                                for line in self.ley_lines)
+        self.line_needs = tuple(math.ceil(threshold)
+                                for threshold in self.thresholds)
+        self.max_need = max(self.line_needs)
+        self.longer_lines = tuple(
+            sum(1 for need in self.line_needs if need > cells)
+            for cells in range(self.max_need + 1))
+        self.win_threshold = len(self.ley_lines) / 2
+        # One header byte, then 2 bits per cell and per ley-line.
+        self.encoded_length = 1 + (2 * (len(self.cell_names) +
+                                        len(self.ley_lines)) + 7) // 8
+
+    def __reduce__(self) -> Tuple[Any, Tuple[int]]:
+        """
+        Pickle this BoardGeometry by its size, so that unpickling gives back
+        the shared layout of that size.
+
+        >>> import pickle
+        >>> pickle.loads(pickle.dumps(get_geometry(2))) is get_geometry(2)
+        True
+        """
+        return get_geometry, (self.size,)
+
+
+def cell_count(size: int) -> int:
+    """
+    Return the number of cells on a board with side length size.
+
+    >>> cell_count(1)
+    3
+    >>> cell_count(5)
+    25
+    """
+    return (size ** 2 + 5 * size) // 2
+
+
+def _build_rows(size: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Return the cell indices of each row of a board with side length size.
+
+    >>> _build_rows(2)
+    ((0, 1), (2, 3, 4), (5, 6))
+    """
+    rows = []
+    temp = 0
+    for i in range(2, size + 2):
+        rows.append(tuple(range(temp, temp + i)))
+        temp += i
+    rows.append(tuple(range(temp, temp + size)))
+    return tuple(rows)
+
+
+def _build_diagonals(rows: Tuple[Tuple[int, ...], ...], size: int,
+                     type_: str) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Return the cell indices of the down-left or down-right ley-lines of the
+    board made of rows if type_ is 'left' or 'right' respectively.
+
+    >>> rows = _build_rows(2)
+    >>> _build_diagonals(rows, 2, 'left')
+    ((0, 2), (1, 3, 5), (4, 6))
+    >>> _build_diagonals(rows, 2, 'right')
+    ((1, 4), (0, 3, 6), (2, 5))
+    """
+    num_rows = len(rows)
+    ley_lines = []
+
+    if type_ == 'left':
+        n = 1
+        k = 1
+        m = -1
+    else:
+        n = -1
+        k = 2
+        m = num_rows
+
+    for i in range(k - 1, size + k):
+        temp_list = []
+        for j in range(max(0, i - k), num_rows - 1):
+            temp_list.append(rows[j][i * n])
+        if i != (k - 1):
+            temp_list.append(rows[num_rows - 1][m + i * n])
+        ley_lines.append(tuple(temp_list))
+    return tuple(ley_lines)
+
+
+_GEOMETRIES = {size: BoardGeometry(size) for size in range(1, MAX_SIZE + 1)}
+_SIZES = {cell_count(size): size for size in _GEOMETRIES}
+
+
+def get_geometry(size: int) -> BoardGeometry:
+    """
+    Return the shared layout of a board with side length size.
+
+    Raise a ValueError if there is no board of that size.
+
+    >>> get_geometry(3) is get_geometry(3)
+    True
+    >>> len(get_geometry(3).ley_lines)
+    12
+    >>> get_geometry(7)
+    Traceback (most recent call last):
+    ...
+    ValueError: size must be between 1 and 5
+    """
+    geometry = _GEOMETRIES.get(size)
+    if geometry is None:
+        raise ValueError('size must be between 1 and {}'.format(MAX_SIZE))
+    return geometry
 
 
 class StonehengeGame(Game):
@@ -16,13 +212,19 @@ class StonehengeGame(Game):
     size: int
     current_state: 'StonehengeState'
 
-    def __init__(self, p1_starts: bool) -> None:
+    def __init__(self, p1_starts: bool, size: Optional[int] = None) -> None:
         """
         Initialize this Game, using p1_starts to find who the first player is.
+        If size is not given, ask the user for the side length of the board.
+
+        Raise a ValueError if there is no board of that size.
         """
-        self.size = int(input('Enter the side length of the board: '))
-        self.current_state = StonehengeState(p1_starts, self.create_cells(),
-                                             ['@'] * (3 * self.size + 3))
+        if size is None:
+            size = int(input('Enter the side length of the board: '))
+        self.size = size
+        self.current_state = StonehengeState(
+            p1_starts, self.create_cells(),
+            ['@'] * len(get_geometry(self.size).ley_lines))
 
     def get_instructions(self) -> str:
         """
@@ -40,9 +242,7 @@ class StonehengeGame(Game):
         """
         Return whether or not this game is over at state.
         """
-        scores = state.ley_line_scores
-        return (scores.count(1) >= len(scores) / 2) or (scores.count(2) >=
-                                                        len(scores) / 2)
+        return state.winner is not None
 
     def is_winner(self, player: str) -> bool:
         """
@@ -59,8 +259,7 @@ class StonehengeGame(Game):
         return some invalid move.
         """
         move = string.strip().upper()
-        cells = self.create_cells()
-        if move in cells:
+        if move in get_geometry(self.size).cell_index:
             return move
         return None
 
@@ -68,10 +267,7 @@ class StonehengeGame(Game):
         """
         Create a board of size self.size.
         """
-        n = self.size
-        letters = [chr(i) for i in range(ord('A'), ord('Z') + 1)]
-        number_of_cells = int(((n ** 2) + 5 * n) / 2)
-        return letters[:number_of_cells]
+        return list(get_geometry(self.size).cell_names)
 
 
 class StonehengeState(GameState):
@@ -85,16 +281,37 @@ class StonehengeState(GameState):
     is either 1, 2, or '@' if the ley-line is unclaimed. The first element
     coressponds to the topleft-most ley-line and the next ley-line in the
     clockwise direction coressponds to the next element in the list.
+    geometry - the shared layout of a board of this size
+    claimed - the number of ley-lines claimed by player 1 and player 2
+    winner - the player (1 or 2) who has claimed at least half of the
+    ley-lines, or None if neither has
+    free - a bitmask of the cells that have not been claimed, where bit i is
+    set if the cell at index i is free
+    p1_cells - a bitmask of the cells claimed by player 1
+    open_lines - a bitmask of the ley-lines that have not been claimed
     """
     size: int
     cells: List[Union[str, int]]
     ley_line_scores: List[Union[str, int]]
+    geometry: BoardGeometry
+    claimed: Tuple[int, int]
+    winner: Optional[int]
+    free: int
+    p1_cells: int
+    open_lines: int
 
     def __init__(self, is_p1_turn: bool, cells: List[Union[str, int]],
-                 ley_line_scores: List[Union[str, int]]) -> None:
+                 ley_line_scores: List[Union[str, int]],
+                 claimed: Optional[Tuple[int, int]] = None,
+                 free: Optional[int] = None,
+                 p1_cells: Optional[int] = None,
+                 open_lines: Optional[int] = None) -> None:
         """
         Initialize this game state and set the current player based on
-        is_p1_turn.
+        is_p1_turn. claimed is the number of ley-lines each player has in
+        ley_line_scores, and free, p1_cells and open_lines are the bitmasks
+        of free cells, of cells claimed by player 1 and of unclaimed
+        ley-lines; all are computed from the board if not given.
 
         >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
         >>> state = StonehengeState(True, cells, ['@'] * 9)
@@ -106,20 +323,37 @@ class StonehengeState(GameState):
         ['@', '@', '@', '@', '@', '@', '@', '@', '@']
         >>> state.size
         2
+        >>> state.claimed, state.winner
+        ((0, 0), None)
+        >>> state = StonehengeState(True, [1, 'B', 2], ['@'] * 6)
+        >>> bin(state.free), bin(state.p1_cells), bin(state.open_lines)
+        ('0b10', '0b1', '0b111111')
         """
         super().__init__(is_p1_turn)
-        if len(cells) == 3:
-            self.size = 1
-        elif len(cells) == 7:
-            self.size = 2
-        elif len(cells) == 12:
-            self.size = 3
-        elif len(cells) == 18:
-            self.size = 4
-        elif len(cells) == 25:
-            self.size = 5
+        self.size = _SIZES[len(cells)]
+        self.geometry = _GEOMETRIES[self.size]
         self.cells = cells
         self.ley_line_scores = ley_line_scores
+        if claimed is None:
+            claimed = (ley_line_scores.count(1), ley_line_scores.count(2))
+        self.claimed = claimed
+        if claimed[0] >= self.geometry.win_threshold:
+            self.winner = 1
+        elif claimed[1] >= self.geometry.win_threshold:
+            self.winner = 2
+        else:
+            self.winner = None
+        if free is None:
+            free = sum(1 << i for i, cell in enumerate(cells)
+                       if type(cell) is str)
+        self.free = free
+        if p1_cells is None:
+            p1_cells = sum(1 << i for i, cell in enumerate(cells) if cell == 1)
+        self.p1_cells = p1_cells
+        if open_lines is None:
+            open_lines = sum(1 << i for i, score in enumerate(ley_line_scores)
+                             if type(score) is str)
+        self.open_lines = open_lines
 
     def __str__(self) -> str:
         """
@@ -184,12 +418,110 @@ class StonehengeState(GameState):
         ['C', 'E', 'G']
         """
         moves = []
-        scores = self.ley_line_scores
-        if not((scores.count(1) >= len(scores) / 2) or
-               (scores.count(2) >= len(scores) / 2)):
-            moves = [cell for cell in self.cells if type(cell) is str]
+        if self.winner is None:
+            names = self.geometry.cell_names
+            free = self.free
+            while free:
+                lowest = free & -free
+                moves.append(names[lowest.bit_length() - 1])
+                free ^= lowest
+        return moves
+
+    def get_search_moves(self) -> List[str]:
+        """
+        Return the moves a search needs to try from this state.
+
+        A free cell whose ley-lines have all been claimed is dead: taking it
+        only passes the turn, so all dead cells lead to the same outcome and
+        only the first of them is returned, along with every live cell.
+
+        >>> state = StonehengeGame(True, 3).current_state
+        >>> for move in ['D', 'C', 'B', 'L', 'I', 'K', 'F']:
+        ...     state = state.make_move(move)
+        >>> state.get_possible_moves()
+        ['A', 'E', 'G', 'H', 'J']
+        >>> state.get_search_moves()
+        ['A', 'E', 'G', 'H']
+        """
+        # Two cells share at most one ley-line, so there can only be two
+        # dead cells once at least five ley-lines are claimed.
+        if sum(self.claimed) < 5 or self.winner is not None:
+            return self.get_possible_moves()
+        geometry = self.geometry
+        open_lines = self.open_lines
+        moves = []
+        dead_found = False
+        free = self.free
+        while free:
+            lowest = free & -free
+            index = lowest.bit_length() - 1
+            free ^= lowest
+            if geometry.cell_line_masks[index] & open_lines:
+                moves.append(geometry.cell_names[index])
+            elif not dead_found:
+                moves.append(geometry.cell_names[index])
+                dead_found = True
         return moves
 
+    def iter_moves(self) -> Iterator[str]:
+        """
+        Yield the moves of get_search_moves, first those that claim a
+        ley-line for the current player and then the rest, each group in
+        the order of get_search_moves. A claiming move is yielded as soon
+        as it is found, before the remaining cells are looked at.
+
+        >>> state = StonehengeGame(True, 2).current_state
+        >>> state = state.make_move('A').make_move('B').make_move('F')
+        >>> state.get_search_moves(), list(state.iter_moves())
+        (['C', 'D', 'E', 'G'], ['D', 'E', 'G', 'C'])
+        """
+        if self.winner is not None:
+            return
+        geometry = self.geometry
+        open_lines = self.open_lines
+        if self.p1_turn:
+            owned = self.p1_cells
+        else:
+            owned = ((1 << len(self.cells)) - 1) & ~self.free & \
+                ~self.p1_cells
+        # Dead cells are only pruned where get_search_moves prunes them.
+        prune_dead = sum(self.claimed) >= 5
+        dead_found = False
+        rest = []
+        free = self.free
+        while free:
+            lowest = free & -free
+            index = lowest.bit_length() - 1
+            free ^= lowest
+            if not geometry.cell_line_masks[index] & open_lines:
+                if not (prune_dead and dead_found):
+                    rest.append(geometry.cell_names[index])
+                dead_found = True
+                continue
+            for i in geometry.cell_lines[index]:
+                if open_lines >> i & 1 and \
+                        (owned & geometry.line_masks[i]).bit_count() + 1 >= \
+                        geometry.line_needs[i]:
+                    yield geometry.cell_names[index]
+                    break
+            else:
+                rest.append(geometry.cell_names[index])
+        yield from rest
+
+    def is_valid_move(self, move: Any) -> bool:
+        """
+        Return whether move is a valid move for this GameState.
+
+        >>> cells = [2, 2, 'C', 1, 'E', 1, 'G']
+        >>> a = StonehengeState(True, cells, ['@'] * 9)
+        >>> a.is_valid_move('C'), a.is_valid_move('A'), a.is_valid_move(None)
+        (True, False, False)
+        """
+        if type(move) is not str or self.winner is not None:
+            return False
+        index = self.geometry.cell_index.get(move)
+        return index is not None and bool(self.free >> index & 1)
+
     def make_move(self, move: Any) -> 'StonehengeState':
         """
         Return the GameState that results from applying move to this GameState.
@@ -210,21 +542,194 @@ class StonehengeState(GameState):
         [1, 2, 'C', 'D', 'E', 'F', 'G']
         >>> c.ley_line_scores
         [1, '@', '@', 2, '@', '@', '@', '@', 1]
+        >>> c.claimed
+        (2, 1)
+        >>> c.make_move('Z')
+        Traceback (most recent call last):
+        ...
+        ValueError: Z is not a cell
         """
-        current_player = int(self.get_current_player_name()[1])
+        current_player = 1 if self.p1_turn else 2
+        geometry = self.geometry
+        index = geometry.cell_index.get(move)
+        if index is None:
+            raise ValueError('{} is not a cell'.format(move))
+        if not self.free >> index & 1:
+            raise ValueError('{} has already been claimed'.format(move))
         cells = self.cells[:]
-        cells[cells.index(move)] = current_player
-        ley_lines = self.get_ley_lines(cells)
+        cells[index] = current_player
         ley_lines_scores = self.ley_line_scores[:]
+        newly_claimed = 0
+        open_lines = self.open_lines
 
-        for i in range(len(ley_lines)):
+        # Only the ley-lines through the claimed cell can change hands.
+        for i in geometry.cell_lines[index]:
             if type(ley_lines_scores[i]) is str:
-                line = ley_lines[i]
-                if line.count(1) >= len(line) / 2:
-                    ley_lines_scores[i] = 1
-                elif line.count(2) >= len(line) / 2:
-                    ley_lines_scores[i] = 2
-        return StonehengeState(not self.p1_turn, cells, ley_lines_scores)
+                owned = [cells[j] for j in geometry.ley_lines[i]].count(
+                    current_player)
+                if owned >= geometry.thresholds[i]:
+                    ley_lines_scores[i] = current_player
+                    newly_claimed += 1
+                    open_lines &= ~(1 << i)
+
+        if self.p1_turn:
+            claimed = (self.claimed[0] + newly_claimed, self.claimed[1])
+            p1_cells = self.p1_cells | 1 << index
+        else:
+            claimed = (self.claimed[0], self.claimed[1] + newly_claimed)
+            p1_cells = self.p1_cells
+        return StonehengeState(not self.p1_turn, cells, ley_lines_scores,
+                               claimed, self.free & ~(1 << index), p1_cells,
+                               open_lines)
+
+    def outcome(self) -> Optional[int]:
+        """
+        Return the score of this state for the current player (WIN, LOSE or
+        DRAW) if the game is over at this state, or if its winner is already
+        decided (see decided_winner), or None otherwise.
+
+        >>> cells = [chr(i) for i in range(ord('A'), ord('D'))]
+        >>> a = StonehengeState(True, cells, ['@'] * 6)
+        >>> a.outcome() is None
+        True
+        >>> a.make_move('A').outcome() == a.LOSE
+        True
+        """
+        winner = self.winner
+        if winner is None:
+            winner = self.decided_winner()
+            if winner is None:
+                return None
+        if winner == (1 if self.p1_turn else 2):
+            return self.WIN
+        return self.LOSE
+
+    def decided_winner(self) -> Optional[int]:
+        """
+        Return the player (1 or 2) who is certain to win from this state
+        however both players move, or None if that is not yet clear.
+
+        A player can still claim an unclaimed ley-line only if it needs no
+        more of their cells than they have moves left: the player to move
+        gets half of the free cells rounded up, the other player half rounded
+        down. Since every game of Stonehenge ends with a winner, a player who
+        cannot reach half of the ley-lines even by claiming every ley-line
+        still in their reach has lost.
+
+        >>> state = StonehengeGame(True, 2).current_state
+        >>> for move in ['B', 'G', 'C']:
+        ...     state = state.make_move(move)
+        >>> state.decided_winner() is None
+        True
+        >>> state = state.make_move('F')
+        >>> state.winner is None, state.decided_winner()
+        (True, 1)
+        >>> state.outcome() == state.WIN
+        True
+        """
+        if self.winner is not None:
+            return self.winner
+        geometry = self.geometry
+        free_count = self.free.bit_count()
+        open_lines = len(geometry.ley_lines) - sum(self.claimed)
+        p1_left = (free_count + self.p1_turn) // 2
+        for player, left in ((1, p1_left), (2, free_count - p1_left)):
+            # The ley-lines the player can lose and still win.
+            spare = self.claimed[player - 1] + open_lines - \
+                geometry.win_threshold
+            # Only ley-lines needing more than left cells can be out of reach,
+            # so most positions are settled without looking at the board.
+            if geometry.longer_lines[min(left, geometry.max_need)] <= spare:
+                continue
+            if player == 1:
+                owned = self.p1_cells
+            else:
+                owned = ((1 << len(self.cells)) - 1) & ~self.free & \
+                    ~self.p1_cells
+            out_of_reach = 0
+            for score, mask, need in zip(self.ley_line_scores,
+                                         geometry.line_masks,
+                                         geometry.line_needs):
+                if type(score) is str and \
+                        need - (owned & mask).bit_count() > left:
+                    out_of_reach += 1
+            if out_of_reach > spare:
+                return 3 - player
+        return None
+
+    def to_bytes(self) -> bytes:
+        """
+        Return the binary encoding of this state.
+
+        The first byte holds the board size in its low 3 bits and whether it
+        is p1's turn in bit 3. It is followed by a little-endian integer with
+        2 bits per cell and then 2 bits per ley-line, each 0 if the cell or
+        ley-line is unclaimed, or the player who claimed it.
+
+        >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
+        >>> a = StonehengeState(True, cells, ['@'] * 9)
+        >>> a.to_bytes().hex()
+        '0a00000000'
+        >>> a.make_move('A').to_bytes().hex()
+        '0201400040'
+        """
+        bits = 0
+        shift = 0
+        for value in self.cells + self.ley_line_scores:
+            if type(value) is int:
+                bits |= value << shift
+            shift += 2
+        header = self.size | (8 if self.p1_turn else 0)
+        return bytes([header]) + bits.to_bytes(
+            self.geometry.encoded_length - 1, 'little')
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, memoryview]) -> 'StonehengeState':
+        """
+        Return the state encoded at the start of data by to_bytes. data may be
+        a memoryview, which is read without copying.
+
+        Raise a ValueError if data does not start with the encoding of a
+        state.
+
+        >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
+        >>> a = StonehengeState(True, cells, ['@'] * 9).make_move('B')
+        >>> b = StonehengeState.from_bytes(a.to_bytes())
+        >>> repr(b) == repr(a), b.cells, b.claimed
+        (True, ['A', 1, 'C', 'D', 'E', 'F', 'G'], (2, 0))
+        >>> StonehengeState.from_bytes(a.to_bytes()[:-1])
+        Traceback (most recent call last):
+        ...
+        ValueError: the encoding of a state of size 2 needs 5 bytes, not 4
+        """
+        length = encoded_length(data)
+        if len(data) < length:
+            raise ValueError('the encoding of a state of size {} needs {} '
+                             'bytes, not {}'.format(data[0] & 7, length,
+                                                    len(data)))
+        geometry = _GEOMETRIES[data[0] & 7]
+        bits = int.from_bytes(data[1:length], 'little')
+        cells = []
+        free = 0
+        for i, name in enumerate(geometry.cell_names):
+            value = bits & 3
+            bits >>= 2
+            if value:
+                cells.append(value)
+            else:
+                cells.append(name)
+                free |= 1 << i
+        scores = []
+        for _ in geometry.ley_lines:
+            value = bits & 3
+            bits >>= 2
+            scores.append(value if value else '@')
+        # Only 1 and 2 stand for players, and the padding must be clear.
+        if bits or 3 in cells or 3 in scores:
+            raise ValueError('{} is not the encoding of a state'.format(
+                bytes(data[:length]).hex()))
+        return cls(bool(data[0] & 8), cells, scores,
+                   (scores.count(1), scores.count(2)), free)
 
     def __repr__(self) -> Any:
         """
@@ -233,10 +738,12 @@ class StonehengeState(GameState):
         """
         return str(self) + "\nP1's turn: {}".format(self.p1_turn)
 
-    def rough_outcome(self) -> float:
+    def rough_outcome(self, stats: Optional[SearchStats] = None,
+                      depth: int = 0) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
-        player can guarantee from state self.
+        player can guarantee from state self. If stats is given, record the
+        states the estimate looks at in it, counting self as being at depth.
 
         >>> cells = [chr(i) for i in range(ord('A'), ord('H'))]
         >>> a = StonehengeState(True, cells, ['@'] * 9)
@@ -249,33 +756,46 @@ class StonehengeState(GameState):
         >>> a.rough_outcome() == score
         True
         """
-        scores = self.ley_line_scores
         if self.p1_turn:
             player, other_player = 1, 2
         else:
             player, other_player = 2, 1
 
-        if scores.count(player) >= len(scores) / 2:
+        if self.winner == player:
             return self.WIN
-        elif scores.count(other_player) >= len(scores) / 2:
+        elif self.winner == other_player:
             return self.LOSE
 
-        temp_list = []
+        if stats is not None:
+            start = time.perf_counter()
+        score = self.LOSE
+        children = 0
         for move in self.get_possible_moves():
             temp_state = self.make_move(move)
+            children += 1
 
-            scores = temp_state.ley_line_scores
-            if scores.count(player) >= len(scores) / 2:
-                return self.WIN
+            if temp_state.winner == player:
+                if stats is not None:
+                    stats.terminal()
+                score = self.WIN
+                break
 
+            if stats is not None:
+                reply_start = time.perf_counter()
             temp_list2 = []
             for move2 in temp_state.get_possible_moves():
                 temp_state2 = temp_state.make_move(move2)
-                scores = temp_state2.ley_line_scores
-                temp_list2.append(scores.count(other_player) >=
-                                  len(scores) / 2)
-            temp_list.append(any(temp_list2))
-        return self.LOSE if all(temp_list) else self.DRAW
+                temp_list2.append(temp_state2.winner == other_player)
+                if stats is not None and temp_state2.winner is not None:
+                    stats.terminal()
+            if stats is not None:
+                stats.expanded(depth + 1, len(temp_list2),
+                               time.perf_counter() - reply_start)
+            if not any(temp_list2):
+                score = self.DRAW
+        if stats is not None:
+            stats.expanded(depth, children, time.perf_counter() - start)
+        return score
 
     def get_ley_lines(self, cells: List[Union[str, int]]) -> \
             List[List[Union[str, int]]]:
@@ -298,11 +818,7 @@ class StonehengeState(GameState):
         >>> a.get_ley_lines(cells)
         [['A'], ['B', 'C'], ['B'], ['A', 'C'], ['C'], ['A', 'B']]
         """
-        ley_lines = []
-        ley_lines.extend(self.extract_diagonal_ley_lines(cells, 'left'))
-        ley_lines.extend(self.extract_diagonal_ley_lines(cells, 'right'))
-        ley_lines.extend(list(reversed(self.extract_rows(cells))))
-        return ley_lines
+        return [[cells[i] for i in line] for line in self.geometry.ley_lines]
 
     def extract_rows(self, cells: List[Union[str, int]]) -> \
             List[List[Union[str, int]]]:
@@ -314,14 +830,7 @@ class StonehengeState(GameState):
         >>> a.extract_rows(cells)
         [['A', 'B'], ['C', 'D', 'E'], ['F', 'G']]
         """
-        n = self.size
-        list_return = []
-        temp = 0
-        for i in range(2, n + 2):
-            list_return.append(cells[temp:temp + i])
-            temp += i
-        list_return.append(cells[-n:])
-        return list_return
+        return [[cells[i] for i in row] for row in self.geometry.rows]
 
     def extract_diagonal_ley_lines(self, cells: List[Union[str, int]],
                                    type_: str) -> List[List[Union[str, int]]]:
@@ -336,27 +845,68 @@ class StonehengeState(GameState):
         >>> a.extract_diagonal_ley_lines(cells, 'right')
         [['B', 'E'], ['A', 'D', 'G'], ['C', 'F']]
         """
-        rows = self.extract_rows(cells)
-        num_rows = len(rows)
-        ley_lines = []
-
         if type_ == 'left':
-            n = 1
-            k = 1
-            m = -1
+            ley_lines = self.geometry.left_lines
         else:
-            n = -1
-            k = 2
-            m = num_rows
-
-        for i in range(k - 1, self.size + k):
-            temp_list = []
-            for j in range(max(0, i - k), num_rows - 1):
-                temp_list.append(rows[j][i * n])
-            if i != (k - 1):
-                temp_list.append(rows[num_rows - 1][m + i * n])
-            ley_lines.append(temp_list)
-        return ley_lines
+            ley_lines = self.geometry.right_lines
+        return [[cells[i] for i in line] for line in ley_lines]
+
+
+def encode_states(states: List[StonehengeState]) -> bytes:
+    """
+    Return the binary encodings of states, one after another.
+
+    >>> game = StonehengeGame(True, 1)
+    >>> len(encode_states([game.current_state] * 3))
+    12
+    """
+    return b''.join(state.to_bytes() for state in states)
+
+
+def encoded_length(data: Union[bytes, memoryview]) -> int:
+    """
+    Return the length of the encoding of a state by to_bytes that starts
+    data, which is given by its first byte.
+
+    Raise a ValueError if data is empty or its first byte does not start the
+    encoding of a state.
+
+    >>> encoded_length(StonehengeGame(True, 5).current_state.to_bytes())
+    12
+    >>> encoded_length(b'\\x07')
+    Traceback (most recent call last):
+    ...
+    ValueError: 0x07 does not start the encoding of a state
+    """
+    if not data:
+        raise ValueError('the encoding of a state cannot be empty')
+    geometry = _GEOMETRIES.get(data[0] & 7)
+    if geometry is None or data[0] >> 4:
+        raise ValueError('{:#04x} does not start the encoding of a '
+                         'state'.format(data[0]))
+    return geometry.encoded_length
+
+
+def decode_states(data: Union[bytes, memoryview]) -> \
+        Iterator[StonehengeState]:
+    """
+    Yield the states encoded one after another in data by encode_states.
+    Records are read through a memoryview, so data is never copied.
+
+    Raise a ValueError if data holds something other than encodings of
+    states.
+
+    >>> game = StonehengeGame(True, 2)
+    >>> states = [game.current_state, game.current_state.make_move('C')]
+    >>> [state.cells for state in decode_states(encode_states(states))]
+    [['A', 'B', 'C', 'D', 'E', 'F', 'G'], ['A', 'B', 1, 'D', 'E', 'F', 'G']]
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        length = encoded_length(view[offset:])
+        yield StonehengeState.from_bytes(view[offset:offset + length])
+        offset += length
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+"""
+Unittests for the binary encoding of Stonehenge states.
+"""
+import unittest
+
+from stonehenge import StonehengeGame, StonehengeState, decode_states, \
+    encode_states
+
+
+def reachable_states(size):
+    """
+    Return every state reachable in play on a board of side length size,
+    from either starting player, by repr.
+
+    Play goes on past positions whose winner is decided until a player has
+    claimed half of the ley-lines or no cells are left, so this includes the
+    positions outcome() stops searching at.
+    """
+    states = {}
+    frontier = [StonehengeGame(p1_starts, size).current_state
+                for p1_starts in (True, False)]
+    while frontier:
+        state = frontier.pop()
+        if repr(state) in states:
+            continue
+        states[repr(state)] = state
+        if state.winner is None:
+            frontier.extend(state.make_move(move)
+                            for move in state.get_possible_moves())
+    return states
+
+
+class StonehengeEncodingUnitTests(unittest.TestCase):
+    def test_round_trip_is_a_bijection(self):
+        """
+        Test that every reachable state of sizes 1 and 2 decodes to an equal
+        state with the same bookkeeping, and that distinct states have
+        distinct encodings.
+        """
+        for size in (1, 2):
+            states = reachable_states(size)
+            encodings = set()
+            for state in states.values():
+                data = state.to_bytes()
+                encodings.add(data)
+                decoded = StonehengeState.from_bytes(data)
+                self.assertEqual(repr(decoded), repr(state))
+                self.assertEqual((decoded.claimed, decoded.free,
+                                  decoded.winner),
+                                 (state.claimed, state.free, state.winner))
+                self.assertEqual(decoded.to_bytes(), data)
+            self.assertEqual(len(encodings), len(states))
+            self.assertEqual(
+                [repr(state) for state in
+                 decode_states(encode_states(list(states.values())))],
+                list(states))
+
+    def test_from_bytes_rejects_corrupt_input(self):
+        """
+        Test that a bad header byte, a short payload or a field no state
+        has raises a ValueError.
+        """
+        data = StonehengeGame(True, 2).current_state.to_bytes()
+        for corrupt in [b'', b'\x00' + data[1:], b'\x0e' + data[1:],
+                        b'\x1a' + data[1:], data[:-1],
+                        data[:1] + b'\x03' + data[2:],
+                        data[:-1] + b'\xc0']:
+            with self.assertRaises(ValueError):
+                StonehengeState.from_bytes(corrupt)
+        with self.assertRaises(ValueError):
+            list(decode_states(data + data[:2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,9 +6,19 @@ Adjust the type annotations as needed, and implement both a recursive
 and an iterative version of minimax.
 """
 
-from typing import Any, Optional, List
+import os
+import pickle
+import time
+import zlib
+from typing import Any, Optional, List, Tuple
 from game import Game
 from game_state import GameState
+from search_budget import SearchBudget
+from search_stats import SearchStats
+from persistent_cache import PersistentCache, state_key
+
+# The first item of every search checkpoint.
+CHECKPOINT_FORMAT = 'minimax-checkpoint 2'
 
 
 class TreeNode:
@@ -19,16 +29,21 @@ class TreeNode:
     value - the value of the TreeNode, which is a GameState
     children - the possible moves from the GameState value
     score - the score of the current state
+    depth - the number of moves between the root of the tree and value
+    moves - the moves from value still to be made, last first, or None if
+    value has not been expanded
     """
     value: GameState
     children: Optional[List["TreeNode"]]
     score: Optional[int]
+    depth: int
+    moves: Optional[List[Any]]
 
     def __init__(self, value: GameState, children: Optional[List["TreeNode"]] =
-                 None, score: Optional[int] = None) -> None:
+                 None, score: Optional[int] = None, depth: int = 0) -> None:
         """
         Create TreeNode self with content value, 0 or more children,
-        and a score.
+        a score and a depth.
 
         >>> state = GameState(True)
         >>> t1 = TreeNode(state, score=1)
@@ -38,10 +53,14 @@ class TreeNode:
         []
         >>> t1.score
         1
+        >>> t1.depth
+        0
         """
         self.value = value
         self.children = children[:] if children is not None else []
         self.score = score
+        self.depth = depth
+        self.moves = None
 
 
 class Stack:
@@ -105,10 +124,12 @@ def interactive_strategy(game: Game) -> Any:
     return game.str_to_move(move)
 
 
-def rough_outcome_strategy(game: Any) -> Any:
+def rough_outcome_strategy(game: Any,
+                           stats: Optional[SearchStats] = None) -> Any:
     """
     Return a move for game by picking a move which results in a state with
-    the lowest rough_outcome() for the opponent.
+    the lowest rough_outcome() for the opponent. If stats is given, record
+    the work done in it, including the states rough_outcome() looks at.
 
     NOTE: game.rough_outcome() should do the following:
         - For a state that's over, it returns the score for the current
@@ -129,98 +150,273 @@ def rough_outcome_strategy(game: Any) -> Any:
     best_move = None
     best_outcome = -2  # Temporarily -- just so we can replace this easily later
 
+    if stats is not None:
+        start = time.perf_counter()
+    moves = current_state.get_search_moves()
+    new_states = [current_state.make_move(move) for move in moves]
+
     # Get the move that results in the lowest rough_outcome for the opponent
-    for move in current_state.get_possible_moves():
-        new_state = current_state.make_move(move)
+    for move, new_state in zip(moves, new_states):
 
         # We multiply the below by -1 since a state that's bad for the opponent
         # is good for us.
-        guessed_score = new_state.rough_outcome() * -1
+        guessed_score = new_state.rough_outcome(stats, 1) * -1
         if guessed_score > best_outcome:
             best_outcome = guessed_score
             best_move = move
+    if stats is not None:
+        stats.expanded(0, len(new_states), time.perf_counter() - start)
 
     # Return the move that resulted in the best rough_outcome
     return best_move
 
 
 # TODO: Implement a recursive version of the minimax strategy.
-def minimax_strategy_r(game: Any) -> Any:
+def minimax_strategy_r(game: Any, stats: Optional[SearchStats] = None,
+                       cache: Optional[PersistentCache] = None,
+                       budget: Optional[SearchBudget] = None) -> Any:
     """
-    Return a move for game by using recursive minimax.
+    Return a move for game by using recursive minimax. If stats is given,
+    record the work done in it. If cache is given, reuse the scores stored in
+    it and store the scores computed. If budget is given, start a search in
+    it and stay within it.
     """
-    moves = game.current_state.get_possible_moves()
-    scores = [get_score(game, game.current_state.make_move(move)) for move in
-              moves]
+    if budget is not None:
+        budget.start()
+    if stats is not None:
+        start = time.perf_counter()
+    moves = game.current_state.get_search_moves()
+    children = [game.current_state.make_move(move) for move in moves]
+    scores = [get_score(game, child, stats, 1, cache, budget)
+              for child in children]
+    if stats is not None:
+        stats.expanded(0, len(children), time.perf_counter() - start)
     return moves[scores.index(min(scores))]
 
 
-def get_score(game: Game, state: GameState) -> int:
+def get_score(game: Game, state: GameState,
+              stats: Optional[SearchStats] = None, depth: int = 0,
+              cache: Optional[PersistentCache] = None,
+              budget: Optional[SearchBudget] = None) -> float:
     """
-    Get all the scores for the possible moves.
-    """
-    curr_state = game.current_state
+    Get all the scores for the possible moves. If stats is given, record the
+    work done in it, counting state as being at depth. If cache is given,
+    look the score of state up in it before searching, and store it after.
 
-    if state.p1_turn:
-        current_player = 'p1'
-        other_player = 'p2'
+    Moves are tried in the order of iter_moves and made one at a time, and
+    the search stops at the first winning move, so the moves after it are
+    never made.
+
+    If budget is given and its nodes are spent, state is scored by the
+    budget's heuristic search instead, and no score computed from then on is
+    stored in cache.
+
+    The outcome of a finished game is read from state itself, so game is never
+    modified and several searches may run on the same game at once.
+    """
+    outcome = state.outcome()
+    if outcome is not None:
+        if stats is not None:
+            stats.terminal()
+        return outcome
+    score = _cached_score(cache, state, stats)
+    if score is not None:
+        return score
+    if budget is not None and not budget.spend():
+        return budget.heuristic_score(state, stats, depth)
+    if stats is not None:
+        start = time.perf_counter()
+    children = 0
+    score = GameState.LOSE
+    for move in state.iter_moves():
+        children += 1
+        score = max(score, -1 * get_score(game, state.make_move(move), stats,
+                                          depth + 1, cache, budget))
+        if score == GameState.WIN:
+            break
+    if stats is not None:
+        stats.expanded(depth, children, time.perf_counter() - start)
+    if cache is not None and (budget is None or not budget.degraded):
+        cache.put(state_key(state), score)
+    return score
+
+
+def _expand_node(node: TreeNode) -> None:
+    """
+    List the moves from the state of node in node.moves, to be made one at a
+    time: every move from the root, so that the best of them can be picked,
+    and the moves of iter_moves from any other node.
+    """
+    if node.depth == 0:
+        moves = node.value.get_search_moves()
     else:
-        current_player = 'p2'
-        other_player = 'p1'
-
-    if game.is_over(state):
-        game.current_state = state
-        if game.is_winner(current_player):
-            game.current_state = curr_state
-            return GameState.WIN
-        elif game.is_winner(other_player):
-            game.current_state = curr_state
-            return GameState.LOSE
-        game.current_state = curr_state
-        return GameState.DRAW
-    a = [get_score(game, state.make_move(move)) for move in
-         state.get_possible_moves()]
-    return max([-1 * score for score in a])
+        moves = list(node.value.iter_moves())
+    node.moves = moves[::-1]
+
+
+def _next_child(node: TreeNode) -> TreeNode:
+    """
+    Make the next of node.moves, add the resulting child to node and return
+    it.
+    """
+    child = TreeNode(node.value.make_move(node.moves.pop()),
+                     depth=node.depth + 1)
+    node.children.append(child)
+    return child
+
+
+def _cached_score(cache: Optional[PersistentCache], state: GameState,
+                  stats: Optional[SearchStats]) -> Optional[int]:
+    """
+    Return the score of state stored in cache, or None if there is no cache
+    or no score for state in it. If stats is given, record the lookup.
+    """
+    if cache is None:
+        return None
+    score = cache.get(state_key(state))
+    if stats is not None:
+        stats.cache_lookup(score is not None)
+    return score
+
+
+def _save_search(path: str, top_node: TreeNode, s: Stack) -> None:
+    """
+    Write the search tree rooted at top_node and its stack s to the file at
+    path as a compressed pickle, replacing the file only once the write is
+    complete. Scored nodes other than the root have no children, so only the
+    nodes on the path being searched and their scored children are written.
+    """
+    data = pickle.dumps((CHECKPOINT_FORMAT, repr(top_node.value), top_node,
+                         s),
+                        pickle.HIGHEST_PROTOCOL)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as checkpoint:
+        checkpoint.write(zlib.compress(data))
+    os.replace(temporary_path, path)
+
+
+def _load_search(path: str, state: GameState) \
+        -> Optional[Tuple[TreeNode, Stack]]:
+    """
+    Return the search tree and stack saved at path by _save_search, or None
+    if there is no saved search or the saved search is not of state.
+
+    Raise a ValueError if the file at path is not a search checkpoint.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as checkpoint:
+        data = checkpoint.read()
+    try:
+        saved = pickle.loads(zlib.decompress(data))
+    except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError, IndexError, TypeError, ValueError):
+        saved = None
+    if not isinstance(saved, tuple) or len(saved) != 4 or \
+            saved[0] != CHECKPOINT_FORMAT:
+        raise ValueError('{} is not a search checkpoint'.format(path))
+    _, root, top_node, s = saved
+    if root != repr(state):
+        return None
+    return top_node, s
 
 
 # TODO: Implement an iterative version of the minimax strategy.
-def minimax_strategy_i(game: Game) -> Any:
+def minimax_strategy_i(game: Game, stats: Optional[SearchStats] = None,
+                       cache: Optional[PersistentCache] = None,
+                       checkpoint_path: Optional[str] = None,
+                       checkpoint_every: int = 100000,
+                       budget: Optional[SearchBudget] = None) -> Any:
     """
-    Return a move for game by using iterative minimax.
+    Return a move for game by using iterative minimax. If stats is given,
+    record the work done in it. If cache is given, reuse the scores stored in
+    it and store the scores computed.
+
+    If checkpoint_path is given, the search tree and stack are saved to it
+    after every checkpoint_every nodes taken off the stack, a search of the
+    same state resumes from the file instead of starting over, and the file
+    is removed once the search finishes. Raise a ValueError if a file at
+    checkpoint_path is not a search checkpoint, or if checkpoint_every is
+    less than 1.
+
+    If budget is given, a search is started in it. Once its nodes are spent,
+    the states left on the stack are scored by its heuristic search instead
+    of being expanded, and no more scores are stored in cache.
+
+    Like get_score, this never modifies game.
     """
+    if checkpoint_every < 1:
+        raise ValueError('checkpoint_every must be at least 1')
     curr_state = game.current_state
-    top_node = TreeNode(curr_state)
-    s = Stack()
-    s.add(top_node)
+    if budget is not None:
+        budget.start()
+    saved = None
+    if checkpoint_path is not None:
+        saved = _load_search(checkpoint_path, curr_state)
+    if saved is not None:
+        top_node, s = saved
+    else:
+        top_node = TreeNode(curr_state)
+        s = Stack()
+        s.add(top_node)
+    # The time each node still being searched was expanded at, by id, for
+    # stats. Nodes expanded before resuming from a checkpoint are timed
+    # from the resume.
+    started = {}
+    resumed_at = time.perf_counter()
+    removed = 0
     while not s.is_empty():
+        if checkpoint_path is not None and removed and \
+                removed % checkpoint_every == 0:
+            _save_search(checkpoint_path, top_node, s)
+        removed += 1
         removed_node = s.remove()
         state = removed_node.value
-        if game.is_over(state):
-            if state.p1_turn:
-                current_player = 'p1'
-                other_player = 'p2'
-            else:
-                current_player = 'p2'
-                other_player = 'p1'
-
-            game.current_state = state
-            if game.is_winner(current_player):
-                removed_node.score = GameState.WIN
-            elif game.is_winner(other_player):
-                removed_node.score = GameState.LOSE
-            else:
-                removed_node.score = GameState.DRAW
-            game.current_state = curr_state
-        elif removed_node.children == []:
+        if removed_node.moves is None:
+            # The root is always expanded, even when its winner is decided,
+            # so that there is a move to pick.
+            outcome = state.outcome() if removed_node.depth > 0 else None
+            if outcome is not None:
+                if stats is not None:
+                    stats.terminal()
+                removed_node.score = outcome
+                continue
+            if removed_node.depth > 0:
+                removed_node.score = _cached_score(cache, state, stats)
+                if removed_node.score is None and budget is not None and \
+                        not budget.spend():
+                    removed_node.score = budget.heuristic_score(
+                        state, stats, removed_node.depth)
+                if removed_node.score is not None:
+                    continue
+            if stats is not None:
+                started[id(removed_node)] = time.perf_counter()
+            _expand_node(removed_node)
+        elif removed_node.depth > 0 and \
+                removed_node.children[-1].score == GameState.LOSE:
+            # The last child is lost for the opponent, so this node is won
+            # and its remaining moves need not be made.
+            removed_node.moves = []
+        if removed_node.moves:
             s.add(removed_node)
-            for move in state.get_possible_moves():
-                child_node = TreeNode(state.make_move(move))
-                removed_node.children.append(child_node)
-                s.add(child_node)
+            s.add(_next_child(removed_node))
         else:
             removed_node.score = max([-1 * child.score for child in
                                       removed_node.children])
-    moves = curr_state.get_possible_moves()
+            if cache is not None and \
+                    (budget is None or not budget.degraded):
+                cache.put(state_key(state), removed_node.score)
+            if stats is not None:
+                stats.expanded(removed_node.depth, len(removed_node.children),
+                               time.perf_counter() -
+                               started.pop(id(removed_node), resumed_at))
+            # Only the scores of the root's children are needed at the end,
+            # so the subtrees below scored nodes are dropped.
+            if removed_node.depth > 0:
+                removed_node.children = []
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    moves = curr_state.get_search_moves()
     child_scores = [child.score for child in top_node.children]
     return moves[child_scores.index(top_node.score * -1)]
 
@@ -0,0 +1,229 @@
+"""
+Unittests for the instrumentation, caching, thread safety and checkpoints
+of the minimax strategies.
+"""
+import concurrent.futures
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import strategy
+from persistent_cache import PersistentCache
+from search_stats import SearchStats
+from stonehenge import StonehengeGame, StonehengeState
+from strategy import minimax_strategy_i, minimax_strategy_r, \
+    rough_outcome_strategy
+
+
+class StrategyUnitTests(unittest.TestCase):
+    def test_search_stats_recursive_and_iterative_agree(self):
+        """
+        Test that both minimax implementations stop at the same winning moves,
+        and so record the same amount of work and pick the same move, when
+        searching the same game.
+        """
+        game = StonehengeGame(True, 2)
+
+        recursive_stats = SearchStats()
+        iterative_stats = SearchStats()
+        self.assertEqual(minimax_strategy_r(game, recursive_stats),
+                         minimax_strategy_i(game, iterative_stats))
+
+        self.assertEqual(recursive_stats.nodes_by_depth,
+                         iterative_stats.nodes_by_depth)
+        self.assertEqual(recursive_stats.terminals, iterative_stats.terminals)
+        self.assertEqual(recursive_stats.moves_made,
+                         recursive_stats.nodes + recursive_stats.terminals - 1)
+        self.assertEqual(recursive_stats.branching_factor(0), 7)
+
+    def test_search_stats_count_every_move(self):
+        """
+        Test that the stats of every strategy count each call to make_move,
+        including those made inside rough_outcome, and that the time at
+        depth 0 covers the time at every other depth.
+        """
+        game = StonehengeGame(True, 2)
+        game.current_state = game.current_state.make_move('A')
+        make_move = StonehengeState.make_move
+        for search in [rough_outcome_strategy, minimax_strategy_r,
+                       minimax_strategy_i]:
+            calls = []
+
+            def counting_make_move(state, move):
+                calls.append(move)
+                return make_move(state, move)
+            stats = SearchStats()
+            with patch.object(StonehengeState, 'make_move',
+                              counting_make_move):
+                search(game, stats)
+            self.assertEqual(stats.moves_made, len(calls))
+            self.assertGreater(stats.terminals, 0)
+            self.assertTrue(all(stats.time_by_depth[0] >= seconds
+                                for seconds in stats.time_by_depth.values()))
+        self.assertEqual(stats.depths(), list(range(len(stats.depths()))))
+
+    def test_persistent_cache_shared_between_strategies(self):
+        """
+        Test that scores cached by one minimax search are reused by a later
+        search through a reopened cache, without changing the chosen move.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['A', 'F', 'D']:
+            game.current_state = game.current_state.make_move(move)
+
+        path = os.path.join(tempfile.mkdtemp(), 'scores')
+        with PersistentCache(path, 1024) as cache:
+            first_move = minimax_strategy_r(game, cache=cache)
+        stats = SearchStats()
+        with PersistentCache(path) as cache:
+            second_move = minimax_strategy_i(game, stats, cache)
+
+        self.assertEqual(first_move, game.str_to_move('E'))
+        self.assertEqual(second_move, first_move)
+        self.assertEqual(stats.nodes, 1)
+        self.assertEqual(stats.cache_misses, 0)
+
+    def test_persistent_cache_rejects_other_files(self):
+        """
+        Test that files too short to hold a header, or holding something
+        else, are rejected with a ValueError without leaking descriptors.
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'scores')
+        before = len(os.listdir('/proc/self/fd'))
+        for data in [b'S', b'SHPC' + bytes(11), bytes(64)]:
+            with open(path, 'wb') as other:
+                other.write(data)
+            with self.assertRaises(ValueError):
+                PersistentCache(path)
+        self.assertEqual(len(os.listdir('/proc/self/fd')), before)
+
+    def test_persistent_cache_is_written_by_its_own_process(self):
+        """
+        Test that a cache opened before a fork cannot be written to by the
+        forked process.
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'scores')
+        with PersistentCache(path, 64) as cache:
+            self.assertTrue(cache.put(b'a', 1))
+            with patch('persistent_cache.os.getpid',
+                       return_value=os.getpid() + 1):
+                with self.assertRaises(RuntimeError):
+                    cache.put(b'b', 1)
+                self.assertEqual(cache.get(b'a'), 1)
+
+    def test_decided_root(self):
+        """
+        Test that both minimax strategies pick a move from a position whose
+        winner is decided before the game is over.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['B', 'G', 'C', 'F']:
+            game.current_state = game.current_state.make_move(move)
+        state = game.current_state
+        self.assertIsNone(state.winner)
+        self.assertIsNotNone(state.outcome())
+
+        move = minimax_strategy_i(game)
+        self.assertTrue(state.is_valid_move(move))
+        self.assertEqual(move, minimax_strategy_r(game))
+
+    def test_concurrent_searches_on_one_game(self):
+        """
+        Test that both minimax strategies can search the same game from
+        several threads at once without changing its current state.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['A', 'F', 'D']:
+            game.current_state = game.current_state.make_move(move)
+        state = game.current_state
+
+        strategies = [minimax_strategy_r,
+                      minimax_strategy_i] * 8
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            moves = list(executor.map(lambda strategy: strategy(game),
+                                      strategies))
+
+        self.assertEqual(moves, [game.str_to_move('E')] * len(strategies))
+        self.assertIs(game.current_state, state)
+
+    def test_iterative_search_resumes_from_checkpoint(self):
+        """
+        Test that an interrupted iterative search resumes from its last
+        checkpoint, picks the same move, and removes the checkpoint.
+        """
+        game = StonehengeGame(True, 2)
+        path = os.path.join(tempfile.mkdtemp(), 'search')
+        full = SearchStats()
+        expected = minimax_strategy_i(game, full)
+
+        expand = strategy._expand_node
+        calls = []
+
+        def interrupted_expand(*args):
+            calls.append(args)
+            if len(calls) > full.nodes // 2:
+                raise KeyboardInterrupt
+            expand(*args)
+        with patch.object(strategy, '_expand_node', interrupted_expand):
+            with self.assertRaises(KeyboardInterrupt):
+                minimax_strategy_i(game, checkpoint_path=path,
+                                   checkpoint_every=100)
+        self.assertTrue(os.path.exists(path))
+
+        resumed = SearchStats()
+        self.assertEqual(minimax_strategy_i(
+            game, resumed, checkpoint_path=path, checkpoint_every=100),
+            expected)
+        self.assertLess(resumed.nodes, full.nodes)
+        self.assertFalse(os.path.exists(path))
+
+    def test_checkpoint_holds_only_the_search_path(self):
+        """
+        Test that the nodes saved in a checkpoint are the path being searched
+        and the children of its nodes, however far the search has gone, and
+        that a file that is not a checkpoint is rejected.
+        """
+        game = StonehengeGame(True, 3)
+        for move in ['A', 'B']:
+            game.current_state = game.current_state.make_move(move)
+        path = os.path.join(tempfile.mkdtemp(), 'search')
+        sizes = []
+        save = strategy._save_search
+
+        def counting_save(checkpoint_path, top_node, s):
+            nodes = 0
+            stack = [top_node]
+            while stack:
+                node = stack.pop()
+                nodes += 1
+                stack.extend(node.children)
+            sizes.append(nodes)
+            save(checkpoint_path, top_node, s)
+        with patch.object(strategy, '_save_search', counting_save):
+            minimax_strategy_i(game, checkpoint_path=path,
+                               checkpoint_every=100)
+        cells = len(game.current_state.cells)
+        self.assertGreater(len(sizes), 10)
+        self.assertLessEqual(max(sizes), 1 + cells * (cells + 1) // 2)
+
+        with open(path, 'wb') as other:
+            other.write(b'not a checkpoint')
+        with self.assertRaises(ValueError):
+            minimax_strategy_i(game, checkpoint_path=path)
+
+    def test_checkpoint_every_must_be_positive(self):
+        """
+        Test that checkpointing after fewer than one node is rejected.
+        """
+        game = StonehengeGame(True, 1)
+        path = os.path.join(tempfile.mkdtemp(), 'search')
+        for every in (0, -5):
+            with self.assertRaises(ValueError):
+                minimax_strategy_i(game, checkpoint_path=path,
+                                   checkpoint_every=every)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
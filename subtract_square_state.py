@@ -3,8 +3,11 @@ An implementation of a state for SubtractSquare.
 
 NOTE: You do not have to run python-ta on this file.
 """
-from typing import Any
+import math
+import threading
+from typing import Any, Iterator, List, Optional
 from game_state import GameState
+from search_stats import SearchStats
 
 
 class SubtractSquareState(GameState):
@@ -29,13 +32,37 @@ class SubtractSquareState(GameState):
     def get_possible_moves(self) -> list:
         """
         Return all possible moves that can be applied to this state.
+
+        >>> SubtractSquareState(True, 10).get_possible_moves()
+        [1, 4, 9]
+        >>> SubtractSquareState(True, 0).get_possible_moves()
+        []
+        """
+        return squares_up_to(self.current_total)
+
+    def iter_moves(self) -> Iterator[int]:
         """
-        moves = []
-        for i in range(1, self.current_total + 1):
-            if i ** 2 <= self.current_total:
-                moves.append(i ** 2)
+        Yield the possible moves from the largest to the smallest, so that
+        taking the whole total, when it is a square, comes first.
 
-        return moves
+        >>> list(SubtractSquareState(True, 10).iter_moves())
+        [9, 4, 1]
+        """
+        for root in range(_isqrt(self.current_total), 0, -1):
+            yield root * root
+
+    def is_valid_move(self, move: Any) -> bool:
+        """
+        Return whether move is a valid move for this GameState.
+
+        >>> state = SubtractSquareState(True, 10)
+        >>> state.is_valid_move(9), state.is_valid_move(2)
+        (True, False)
+        >>> state.is_valid_move(16), state.is_valid_move('4')
+        (False, False)
+        """
+        return type(move) is int and move <= self.current_total and \
+            is_pos_square(move)
 
     def make_move(self, move: Any) -> "SubtractSquareState":
         """
@@ -56,21 +83,69 @@ class SubtractSquareState(GameState):
         return "P1's Turn: {} - Total: {}".format(self.p1_turn,
                                                   self.current_total)
 
-    def rough_outcome(self) -> float:
+    def outcome(self) -> Optional[int]:
+        """
+        Return the score of this state for the current player (WIN, LOSE or
+        DRAW) if the game is over at this state, or None if it is not.
+
+        >>> SubtractSquareState(True, 0).outcome() == SubtractSquareState.LOSE
+        True
+        >>> SubtractSquareState(True, 4).outcome() is None
+        True
+        """
+        if self.current_total == 0:
+            return self.LOSE
+        return None
+
+    def rough_outcome(self, stats: Optional[SearchStats] = None,
+                      depth: int = 0) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
-        player can guarantee from state self.
+        player can guarantee from state self. The estimate is computed from
+        the total without making any moves, so nothing is recorded in stats.
         """
         if is_pos_square(self.current_total):
             return self.WIN
-        elif all([is_pos_square(self.current_total - n ** 2)
-                  for n in range(1, self.current_total + 1)
-                  if n ** 2 < self.current_total]):
+        elif all(is_pos_square(self.current_total - square)
+                 for square in squares_up_to(self.current_total - 1)):
             return self.LOSE
 
         return self.DRAW
 
 
+# The positive squares in increasing order, shared by every state. The list
+# only ever grows, under _SQUARES_LOCK, so its first squares never change.
+_SQUARES: List[int] = [i * i for i in range(1, 101)]
+_SQUARES_LOCK = threading.Lock()
+
+
+def _isqrt(n: int) -> int:
+    """
+    Return the number of positive squares no greater than n.
+    """
+    return math.isqrt(n) if n > 0 else 0
+
+
+def squares_up_to(n: int) -> List[int]:
+    """
+    Return a new list of the positive squares no greater than n, in
+    increasing order, sliced from a table shared by every call.
+
+    >>> squares_up_to(17)
+    [1, 4, 9, 16]
+    >>> squares_up_to(16) is squares_up_to(16)
+    False
+    >>> squares_up_to(10 ** 6)[-1]
+    1000000
+    """
+    count = _isqrt(n)
+    if count > len(_SQUARES):
+        with _SQUARES_LOCK:
+            _SQUARES.extend(i * i for i in range(len(_SQUARES) + 1,
+                                                 2 * count + 1))
+    return _SQUARES[:count]
+
+
 def is_pos_square(n: int) -> bool:
     """
     Return whether n is a positive perfect square
@@ -79,8 +154,10 @@ def is_pos_square(n: int) -> bool:
     False
     >>> is_pos_square(9)
     True
+    >>> is_pos_square(10 ** 30 + 1), is_pos_square(10 ** 30)
+    (False, True)
     """
-    return 0 < n and (round(n ** 0.5) ** 2 == n)
+    return 0 < n and math.isqrt(n) ** 2 == n
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+"""
+Unittests for the moves of Subtract Square states.
+"""
+import unittest
+
+from subtract_square_state import SubtractSquareState, squares_up_to
+
+
+class SubtractSquareStateUnitTests(unittest.TestCase):
+    def test_moves_can_be_modified(self):
+        """
+        Test that modifying the moves returned for one state does not change
+        the moves of any other state.
+        """
+        moves = SubtractSquareState(True, 20).get_possible_moves()
+        moves.reverse()
+        moves.remove(4)
+        squares_up_to(17).clear()
+        self.assertEqual(SubtractSquareState(False, 18).get_possible_moves(),
+                         [1, 4, 9, 16])
+        self.assertEqual(list(SubtractSquareState(True, 24).iter_moves()),
+                         [16, 9, 4, 1])
+
+    def test_moves_of_large_totals(self):
+        """
+        Test that the moves of totals beyond the precomputed squares are
+        every square up to the total.
+        """
+        total = 10 ** 5 + 3
+        self.assertEqual(SubtractSquareState(True, total).get_possible_moves(),
+                         [i * i for i in range(1, 317)])
+        self.assertEqual(squares_up_to(99), [i * i for i in range(1, 10)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+Threat-space search for Stonehenge.
+
+A player threatens to win when they have a move that would give them half
+of the ley-lines at once. Threat-space search tries to prove that the player
+to move can win by making only threatening moves: the opponent must answer
+each threat by stopping it, which leaves them very few replies worth
+searching, and a reply that does not stop every threat loses immediately.
+The attacker's quiet moves are never tried, so in tactical positions a win
+is found with a small fraction of the nodes a full search would need.
+
+When no forced win is found, threat_space_strategy falls back to the
+solver.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from search_budget import SearchBudget
+from solver import solver_strategy
+from stonehenge import StonehengeState
+
+# The most threatening moves the attacker may make in a proof.
+DEFAULT_MAX_THREATS = 6
+
+
+def _new_claims(state: StonehengeState, index: int, player: int) -> int:
+    """
+    Return the number of ley-lines player would claim by taking the free
+    cell at index in state.
+    """
+    geometry = state.geometry
+    claims = 0
+    for i in geometry.cell_lines[index]:
+        if type(state.ley_line_scores[i]) is str:
+            owned = 1 + [state.cells[j] for j in
+                         geometry.ley_lines[i]].count(player)
+            if owned >= geometry.thresholds[i]:
+                claims += 1
+    return claims
+
+
+def winning_moves(state: StonehengeState, player: int) -> List[str]:
+    """
+    Return the moves that would win the game at once for player (1 or 2) if
+    it were their turn in state.
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 2).current_state
+    >>> state = state.make_move('A').make_move('F').make_move('D')
+    >>> winning_moves(state, 1), winning_moves(state, 2)
+    (['B', 'E'], [])
+    """
+    if state.winner is not None:
+        return []
+    geometry = state.geometry
+    needed = geometry.win_threshold - state.claimed[player - 1]
+    moves = []
+    free = state.free
+    while free:
+        lowest = free & -free
+        index = lowest.bit_length() - 1
+        if _new_claims(state, index, player) >= needed:
+            moves.append(geometry.cell_names[index])
+        free ^= lowest
+    return moves
+
+
+def threats(state: StonehengeState) -> List[str]:
+    """
+    Return the moves for the player to move in state after which they
+    could win the game with their next move.
+
+    >>> from stonehenge import StonehengeGame
+    >>> state = StonehengeGame(True, 2).current_state
+    >>> state = state.make_move('A').make_move('F')
+    >>> threats(state)
+    ['B', 'C', 'D', 'E', 'G']
+    """
+    player = 1 if state.p1_turn else 2
+    return [move for move in state.get_search_moves()
+            if winning_moves(state.make_move(move), player)]
+
+
+class ThreatSearch:
+    """
+    A search for wins made of threatening moves only.
+
+    max_threats - the most threatening moves the attacker may make
+    nodes - the number of positions searched
+    """
+    max_threats: int
+    nodes: int
+
+    def __init__(self, max_threats: int = DEFAULT_MAX_THREATS) -> None:
+        """
+        Initialize this ThreatSearch.
+
+        >>> ThreatSearch(4).max_threats
+        4
+        """
+        self.max_threats = max_threats
+        self.nodes = 0
+        self._memo: Dict[Tuple[bytes, int], Optional[str]] = {}
+
+    def prove_win(self, state: StonehengeState) -> Optional[str]:
+        """
+        Return a move that wins for the player to move in state no matter
+        how the opponent replies, or None if no win made of at most
+        max_threats threatening moves was found.
+
+        >>> from stonehenge import StonehengeGame
+        >>> state = StonehengeGame(True, 2).current_state
+        >>> ThreatSearch().prove_win(state)
+        'A'
+        >>> ThreatSearch().prove_win(state.make_move('C')) is None
+        True
+        """
+        if state.winner is not None:
+            return None
+        return self._attack(state, self.max_threats)
+
+    def _attack(self, state: StonehengeState, threats_left: int) \
+            -> Optional[str]:
+        """
+        Return a winning move for the player to move in state that makes at
+        most threats_left threats, or None if there is none.
+        """
+        self.nodes += 1
+        player = 1 if state.p1_turn else 2
+        wins = winning_moves(state, player)
+        if wins:
+            return wins[0]
+        if threats_left == 0:
+            return None
+        key = (state.to_bytes(), threats_left)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        for move in threats(state):
+            if self._defend(state.make_move(move), threats_left - 1):
+                result = move
+                break
+        self._memo[key] = result
+        return result
+
+    def _defend(self, state: StonehengeState, threats_left: int) -> bool:
+        """
+        Return whether the player to move in state loses to threats of the
+        opponent, who may make at most threats_left more threats.
+        """
+        self.nodes += 1
+        if winning_moves(state, 1 if state.p1_turn else 2):
+            return False
+        for move in state.iter_moves():
+            reply = state.make_move(move)
+            if self._attack(reply, threats_left) is None:
+                return False
+        return True
+
+
+def threat_space_strategy(game: Any,
+                          budget: Optional[SearchBudget] = None) -> Any:
+    """
+    Return a move for game that wins by threats if one is found, or else the
+    move the solver picks within budget, if it is given. Games other than
+    Stonehenge go straight to the solver.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> for move in ['A', 'F', 'D']:
+    ...     game.current_state = game.current_state.make_move(move)
+    >>> threat_space_strategy(game)
+    'E'
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> threat_space_strategy(SubtractSquareGame(True, 18))
+    1
+    """
+    if not isinstance(game.current_state, StonehengeState):
+        return solver_strategy(game, budget)
+    move = ThreatSearch().prove_win(game.current_state)
+    if move is None:
+        move = solver_strategy(game, budget)
+    return move
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,33 @@
+"""
+Unittests for threat-space search.
+"""
+import unittest
+
+from solver import Solver
+from stonehenge import StonehengeGame
+from threat_space import ThreatSearch
+
+
+class ThreatSpaceUnitTests(unittest.TestCase):
+    def test_threat_space_wins_are_solver_wins(self):
+        """
+        Test that every win proved by threat-space search on a board of size 2
+        after two moves is a win according to the solver.
+        """
+        game = StonehengeGame(True, 2)
+        solver = Solver()
+        proved = 0
+        for first in game.current_state.get_possible_moves():
+            state = game.current_state.make_move(first)
+            for second in state.get_possible_moves():
+                position = state.make_move(second)
+                move = ThreatSearch().prove_win(position)
+                if move is not None:
+                    proved += 1
+                    self.assertEqual(solver.score(position.make_move(move)),
+                                     position.LOSE)
+        self.assertGreater(proved, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()